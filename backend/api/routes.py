@@ -1,8 +1,26 @@
+import hmac
 import logging
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Header
 from fastapi import Request
+from fastapi.responses import PlainTextResponse, Response
 from pydantic import BaseModel
-from typing import Dict, Any
+from typing import Dict, Any, Optional, List
+import json
+import math
+import os
+import time
+from ..engine.matrix import matrix_slots, point_matrix
+from ..engine.executor import Overloaded, SearchTimeout
+from ..engine.dijkstra import SearchLimitExceeded
+from ..engine import metrics
+from ..engine.geometry import encode_polyline, pack_coords, simplify
+
+try:
+    import orjson
+except ImportError:  # optional; falls back to the stdlib encoder
+    orjson = None
+
+ROUTE_FORMATS = ('geojson', 'polyline', 'polyline6', 'binary')
 
 class Point(BaseModel):
     lat: float
@@ -11,9 +29,40 @@ class Point(BaseModel):
 class RouteRequest(BaseModel):
     start: Point
     end: Point
+    algorithm: Optional[str] = None  # astar | alt | ch; default from ROUTER_ALGORITHM
+    format: Optional[str] = None  # geojson | polyline | polyline6 | binary; default from the Accept header
+    simplify: Optional[float] = None  # Douglas-Peucker tolerance in meters
+
+class MatrixRequest(BaseModel):
+    sources: List[Point]
+    targets: List[Point]
+
+class RoadUpdateRequest(BaseModel):
+    # Both empty: apply the pending road_changes log
+    upserted: List[int] = []
+    deleted: List[int] = []
+
+class CostOverride(BaseModel):
+    road_id: int
+    closed: bool = False
+    factor: Optional[float] = None  # >= 1; neither closed nor factor restores the built cost
+
+class OverrideRequest(BaseModel):
+    overrides: List[CostOverride]
 
 router = APIRouter()
 
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    # Graph endpoints exist only with ADMIN_TOKEN set, and need it in X-Admin-Token
+    token = os.getenv('ADMIN_TOKEN')
+    if not token:
+        raise HTTPException(status_code=404, detail='Not Found')
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, token):
+        raise HTTPException(status_code=403, detail='Invalid admin token')
+
+# Endpoints that modify the served graph
+admin_router = APIRouter(dependencies=[Depends(require_admin)])
+
 # Objects initialized externally and injected
 engine_objects: Dict[str, Any] = {}
 
@@ -22,39 +71,197 @@ def status(request: Request):
     logging.info(f"[API] /status called from {request.client.host}")
     builder = engine_objects.get('builder')
     router_obj = engine_objects.get('router')
-    initialized = bool(builder and router_obj and router_obj.graph)
-    node_count = len(getattr(builder, 'node_index', {})) if builder else 0
-    edge_count = sum(len(v) for v in getattr(router_obj, 'graph', {}).values()) if router_obj else 0
+    executor = engine_objects.get('executor')
+    csr = getattr(router_obj, 'csr', None)
+    initialized = bool(builder and csr is not None and csr.num_nodes)
+    node_count = csr.num_nodes if csr is not None else 0
+    edge_count = csr.num_edges if csr is not None else 0
     resp = {
         "initialized": initialized,
         "nodes": node_count,
-        "edges": edge_count
+        "edges": edge_count,
+        "algorithms": router_obj.algorithms() if router_obj else [],
+        "default_algorithm": getattr(router_obj, 'algorithm', None),
+        "executor": executor.stats() if executor else None,
+        "cache": router_obj.cache_stats() if router_obj else None
     }
     logging.info(f"[API] /status response: {resp}")
     return resp
 
+def _overloaded(e: Exception) -> HTTPException:
+    logging.warning(f"[API] Rejected, engine overloaded: {e}")
+    return HTTPException(status_code=503, detail='Routing engine overloaded, retry later', headers={'Retry-After': '1'})
+
 @router.post('/route')
-def route(req: RouteRequest, request: Request):
+async def route(req: RouteRequest, request: Request):
+    started = time.perf_counter()
+    status_code = 500
+    try:
+        response = await _route(req, request)
+        status_code = 200
+        return response
+    except HTTPException as e:
+        status_code = e.status_code
+        raise
+    finally:
+        metrics.ROUTE_SECONDS.observe(time.perf_counter() - started, str(status_code))
+
+async def _route(req: RouteRequest, request: Request) -> Response:
     logging.info(f"[API] /route called from {request.client.host} with: {req}")
     builder = engine_objects.get('builder')
-    router_obj = engine_objects.get('router')
-    if not builder or not router_obj:
+    executor = engine_objects.get('executor')
+    if not builder or not executor:
         logging.error("[API] Routing engine not initialized")
         raise HTTPException(status_code=500, detail='Routing engine not initialized')
-    coords = router_obj.route(req.start.lat, req.start.lon, req.end.lat, req.end.lon)
+    fmt = req.format or ('binary' if 'application/octet-stream' in request.headers.get('accept', '') else 'geojson')
+    if fmt not in ROUTE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format '{fmt}', expected one of {', '.join(ROUTE_FORMATS)}")
+    timings: Dict[str, float] = {}
+    stats: Dict[str, int] = {}
+    try:
+        coords = await executor.route(req.start.lat, req.start.lon, req.end.lat, req.end.lon, req.algorithm,
+                                      timings, stats)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Overloaded as e:
+        raise _overloaded(e)
+    except SearchTimeout as e:
+        logging.warning(f"[API] Route timed out for: {req}")
+        raise HTTPException(status_code=504, detail=str(e))
+    except SearchLimitExceeded as e:
+        logging.warning(f"[API] Route search limit hit for: {req}")
+        raise HTTPException(status_code=422, detail=str(e))
+    finally:
+        metrics.observe_phases(timings)
+    if 'settled' in stats:
+        metrics.ROUTE_SETTLED.observe(stats['settled'], req.algorithm or executor.router.algorithm)
     if not coords:
         logging.warning(f"[API] Route not found for: {req}")
         raise HTTPException(status_code=404, detail='Route not found')
-    # GeoJSON LineString
+    t0 = time.perf_counter()
+    if req.simplify:
+        coords = simplify(coords, req.simplify)
+    response = _encode_route(coords, fmt)
+    metrics.ROUTE_PHASE_SECONDS.observe(time.perf_counter() - t0, 'serialize')
+    logging.info(f"[API] /route response: {fmt}, {len(coords)} points, {len(response.body)} bytes")
+    return response
+
+def _dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':')).encode()
+
+def _encode_route(coords: List[tuple], fmt: str) -> Response:
+    if fmt == 'binary':
+        # int32 lat, lon pairs in 1e-7 degrees
+        return Response(pack_coords(coords), media_type='application/octet-stream',
+                        headers={'X-Route-Points': str(len(coords))})
+    if fmt in ('polyline', 'polyline6'):
+        precision = 6 if fmt == 'polyline6' else 5
+        body = {"polyline": encode_polyline(coords, precision), "precision": precision, "points": len(coords)}
+        return Response(_dumps(body), media_type='application/json')
+    # GeoJSON LineString; 6 decimals is ~0.1 m
     geojson = {
         "type": "Feature",
         "geometry": {
             "type": "LineString",
-            "coordinates": [[lon, lat] for (lat, lon) in coords]
+            "coordinates": [[round(lon, 6), round(lat, 6)] for (lat, lon) in coords]
         },
         "properties": {
             "points": len(coords)
         }
     }
-    logging.info(f"[API] /route response: {geojson}")
-    return geojson
+    return Response(_dumps(geojson), media_type='application/json')
+
+@router.get('/metrics')
+def metrics_endpoint():
+    """Prometheus text exposition of route latency histograms and engine counters."""
+    executor = engine_objects.get('executor')
+    router_obj = engine_objects.get('router')
+    gauges: Dict[str, float] = {}
+    counters: Dict[str, float] = {}
+    if executor:
+        gauges['pathforge_executor_in_flight'] = executor.in_flight
+        counters['pathforge_executor_rejected_total'] = executor.rejected
+        counters['pathforge_executor_timeouts_total'] = executor.timeouts
+    if router_obj:
+        for name, cache in router_obj.cache_stats().items():
+            gauges[f'pathforge_{name}_cache_bytes'] = cache['bytes']
+            counters[f'pathforge_{name}_cache_hits_total'] = cache['hits']
+            counters[f'pathforge_{name}_cache_misses_total'] = cache['misses']
+    return PlainTextResponse(metrics.render(gauges, counters), media_type='text/plain; version=0.0.4')
+
+@router.post('/matrix')
+async def matrix(req: MatrixRequest, request: Request):
+    logging.info(f"[API] /matrix called from {request.client.host}: {len(req.sources)}x{len(req.targets)}")
+    router_obj = engine_objects.get('router')
+    executor = engine_objects.get('executor')
+    if not engine_objects.get('builder') or not router_obj or not executor:
+        logging.error("[API] Routing engine not initialized")
+        raise HTTPException(status_code=500, detail='Routing engine not initialized')
+    max_cells = int(os.getenv('MATRIX_MAX_CELLS', '10000'))
+    if len(req.sources) * len(req.targets) > max_cells:
+        raise HTTPException(status_code=400, detail=f'Matrix larger than {max_cells} cells')
+    points = ([(p.lat, p.lon) for p in req.sources], [(p.lat, p.lon) for p in req.targets])
+    try:
+        # Snapping runs in the work item too, under admission control
+        costs, sources, targets = await executor.call(point_matrix, router_obj, *points, executor,
+                                                      time.time() + executor.timeout, timeout=executor.timeout,
+                                                      slots=matrix_slots(executor, len(points[0])))
+    except Overloaded as e:
+        raise _overloaded(e)
+    except SearchTimeout as e:
+        logging.warning(f"[API] Matrix timed out: {len(req.sources)}x{len(req.targets)}")
+        raise HTTPException(status_code=504, detail=str(e))
+    except SearchLimitExceeded as e:
+        logging.warning(f"[API] Matrix search limit hit: {len(req.sources)}x{len(req.targets)}")
+        raise HTTPException(status_code=422, detail=str(e))
+    # Unreachable pairs are null
+    return {
+        "costs": [[c if math.isfinite(c) else None for c in row] for row in costs.tolist()],
+        "sources": [{"lat": s.lat, "lon": s.lon} if s else None for s in sources],
+        "targets": [{"lat": t.lat, "lon": t.lon} if t else None for t in targets],
+        "units": "meters"
+    }
+
+def _updater():
+    updater = engine_objects.get('updater')
+    if not updater:
+        logging.error("[API] Routing engine not initialized")
+        raise HTTPException(status_code=500, detail='Routing engine not initialized')
+    return updater
+
+@admin_router.post('/graph/updates')
+async def graph_updates(req: RoadUpdateRequest, request: Request):
+    logging.info(f"[API] /graph/updates called from {request.client.host}: "
+                 f"{len(req.upserted)} upserted, {len(req.deleted)} deleted")
+    updater = _updater()
+    try:
+        result = await updater.update_roads(req.upserted, req.deleted)
+    except Exception as e:
+        logging.error(f"[API] Graph update failed: {e}")
+        raise HTTPException(status_code=500, detail=f'Graph update failed: {e}')
+    engine_objects['router'] = updater.executor.router
+    logging.info(f"[API] /graph/updates response: {result}")
+    return result
+
+@admin_router.get('/graph/overrides')
+def get_overrides():
+    router_obj = engine_objects.get('router')
+    overrides = router_obj.overrides if router_obj else {}
+    return {"overrides": [_override_json(road, factor) for road, factor in sorted(overrides.items())]}
+
+@admin_router.post('/graph/overrides')
+async def set_overrides(req: OverrideRequest, request: Request):
+    logging.info(f"[API] /graph/overrides called from {request.client.host}: {len(req.overrides)} roads")
+    changes = {o.road_id: math.inf if o.closed else o.factor for o in req.overrides}
+    try:
+        edges = await _updater().set_overrides(changes)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"edges": edges, **get_overrides()}
+
+def _override_json(road: int, factor: float) -> Dict[str, Any]:
+    if math.isinf(factor):
+        return {"road_id": road, "closed": True, "factor": None}
+    return {"road_id": road, "closed": False, "factor": factor}
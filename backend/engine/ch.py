@@ -0,0 +1,280 @@
+"""Contraction Hierarchies: offline preprocessing and bidirectional query.
+
+Nodes are contracted in order of edge difference; shortcuts remember the
+contracted middle node so query paths unpack back to original nodes.
+"""
+from typing import Dict, List, Tuple, Optional
+import heapq
+from pathlib import Path
+import numpy as np
+from .csr_graph import CSRGraph
+from .snapshot import write_snapshot, open_matching
+from .dijkstra import SearchLimitExceeded
+
+NO_MIDDLE = -1
+
+
+class CHGraph:
+    """Upward edges per node for the forward search and upward in-edges for the backward search.
+
+    ``up_*``: edge ``u -> w`` with ``rank[w] > rank[u]``, stored at ``u``.
+    ``down_*``: edge ``u -> x`` with ``rank[u] > rank[x]``, stored at ``x``.
+    ``*_mid`` holds the shortcut middle node or ``-1`` for original edges.
+    """
+
+    def __init__(self, rank: np.ndarray,
+                 up_offsets: np.ndarray, up_targets: np.ndarray, up_costs: np.ndarray, up_mid: np.ndarray,
+                 down_offsets: np.ndarray, down_sources: np.ndarray, down_costs: np.ndarray, down_mid: np.ndarray):
+        self.rank = rank
+        self.up_offsets = up_offsets
+        self.up_targets = up_targets
+        self.up_costs = up_costs
+        self.up_mid = up_mid
+        self.down_offsets = down_offsets
+        self.down_sources = down_sources
+        self.down_costs = down_costs
+        self.down_mid = down_mid
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.rank)
+
+    @property
+    def num_shortcuts(self) -> int:
+        return int(np.count_nonzero(self.up_mid >= 0) + np.count_nonzero(self.down_mid >= 0))
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {f"ch_{k}": v for k, v in vars(self).items()}
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> 'CHGraph':
+        return cls(**{k[3:]: v for k, v in arrays.items() if k.startswith('ch_')})
+
+    def _up(self, node: int) -> Tuple[List[int], List[float], List[int]]:
+        lo, hi = self.up_offsets[node], self.up_offsets[node + 1]
+        return self.up_targets[lo:hi].tolist(), self.up_costs[lo:hi].tolist(), self.up_mid[lo:hi].tolist()
+
+    def _down(self, node: int) -> Tuple[List[int], List[float], List[int]]:
+        lo, hi = self.down_offsets[node], self.down_offsets[node + 1]
+        return self.down_sources[lo:hi].tolist(), self.down_costs[lo:hi].tolist(), self.down_mid[lo:hi].tolist()
+
+    def query(self, sources: Dict[int, float], targets: Dict[int, float],
+              stats: Optional[Dict[str, int]] = None, max_settled: int = 0) -> Optional[Tuple[float, List[int]]]:
+        """Shortest path from any source to any target with initial/final offsets.
+
+        Returns ``(cost, nodes)`` with nodes in the original graph, or None.
+        Raises ``SearchLimitExceeded`` past ``max_settled`` nodes (0 = no limit).
+        """
+        settled = 0
+        dist_f: Dict[int, float] = dict(sources)
+        dist_b: Dict[int, float] = dict(targets)
+        parent_f: Dict[int, Tuple[int, int]] = {}
+        parent_b: Dict[int, Tuple[int, int]] = {}
+        queue_f = [(c, n) for n, c in sources.items()]
+        queue_b = [(c, n) for n, c in targets.items()]
+        heapq.heapify(queue_f)
+        heapq.heapify(queue_b)
+        best = float('inf')
+        meet = None
+        for n, c in sources.items():
+            if n in dist_b and c + dist_b[n] < best:
+                best, meet = c + dist_b[n], n
+
+        while True:
+            top_f = queue_f[0][0] if queue_f else float('inf')
+            top_b = queue_b[0][0] if queue_b else float('inf')
+            if min(top_f, top_b) >= best:
+                break
+            forward = top_f <= top_b
+            queue, dist, other, parent = (queue_f, dist_f, dist_b, parent_f) if forward else (queue_b, dist_b, dist_f, parent_b)
+            d, node = heapq.heappop(queue)
+            if d > dist[node]:
+                continue
+            settled += 1
+            if max_settled and settled > max_settled:
+                raise SearchLimitExceeded(f"settled more than {max_settled} nodes")
+            nbrs, costs, mids = self._up(node) if forward else self._down(node)
+            for nxt, cost, mid in zip(nbrs, costs, mids):
+                nd = d + cost
+                if nd < dist.get(nxt, float('inf')):
+                    dist[nxt] = nd
+                    parent[nxt] = (node, mid)
+                    heapq.heappush(queue, (nd, nxt))
+                    if nxt in other and nd + other[nxt] < best:
+                        best, meet = nd + other[nxt], nxt
+        if stats is not None:
+            stats['settled'] = settled
+        if meet is None:
+            return None
+        return best, self._unpack_path(meet, parent_f, parent_b)
+
+    def _unpack_path(self, meet: int, parent_f: Dict[int, Tuple[int, int]], parent_b: Dict[int, Tuple[int, int]]) -> List[int]:
+        # Forward half: source ... meet
+        up_edges: List[Tuple[int, int, int]] = []
+        node = meet
+        while node in parent_f:
+            prev, mid = parent_f[node]
+            up_edges.append((prev, node, mid))
+            node = prev
+        up_edges.reverse()
+        path = [node]
+        for a, b, mid in up_edges:
+            path.extend(self._unpack(a, b, mid))
+        # Backward half: meet ... target
+        node = meet
+        while node in parent_b:
+            nxt, mid = parent_b[node]
+            path.extend(self._unpack(node, nxt, mid))
+            node = nxt
+        return path
+
+    def _unpack(self, a: int, b: int, mid: int) -> List[int]:
+        """Original nodes after ``a`` on edge ``a -> b`` (``b`` included)."""
+        out: List[int] = []
+        stack = [(a, b, mid)]
+        while stack:
+            u, w, m = stack.pop()
+            if m == NO_MIDDLE:
+                out.append(w)
+                continue
+            # u -> m is a down edge stored at m, m -> w an up edge stored at m
+            stack.append((m, w, self._mid_of(self.up_offsets, self.up_targets, self.up_mid, m, w)))
+            stack.append((u, m, self._mid_of(self.down_offsets, self.down_sources, self.down_mid, m, u)))
+        return out
+
+    @staticmethod
+    def _mid_of(offsets: np.ndarray, nbrs: np.ndarray, mids: np.ndarray, node: int, other: int) -> int:
+        lo, hi = int(offsets[node]), int(offsets[node + 1])
+        hits = np.flatnonzero(nbrs[lo:hi] == other)
+        if not len(hits):
+            raise KeyError(f"missing CH edge {node}-{other}")
+        return int(mids[lo + hits[0]])
+
+
+class _Contractor:
+    def __init__(self, csr: CSRGraph, witness_limit: int):
+        n = csr.num_nodes
+        self.witness_limit = witness_limit
+        self.out: List[Dict[int, float]] = [{} for _ in range(n)]
+        self.inn: List[Dict[int, float]] = [{} for _ in range(n)]
+        self.edges: Dict[Tuple[int, int], Tuple[float, int]] = {}
+        self.deleted = [0] * n
+        offsets = csr.offsets.tolist()
+        targets = csr.targets.tolist()
+        costs = csr.costs.tolist()
+        for u in range(n):
+            for i in range(offsets[u], offsets[u + 1]):
+                w, c = targets[i], costs[i]
+                if w == u or c >= self.out[u].get(w, float('inf')):
+                    continue
+                self.out[u][w] = c
+                self.inn[w][u] = c
+                self.edges[(u, w)] = (c, NO_MIDDLE)
+
+    def _witness(self, source: int, skip: int, targets: Dict[int, float], limit: float) -> Dict[int, float]:
+        # Bounded Dijkstra from source that avoids the node being contracted
+        dist = {source: 0.0}
+        heap = [(0.0, source)]
+        settled = 0
+        remaining = set(targets)
+        while heap and remaining and settled < self.witness_limit:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            if d > limit:
+                break
+            settled += 1
+            remaining.discard(u)
+            for w, c in self.out[u].items():
+                if w == skip:
+                    continue
+                nd = d + c
+                if nd < dist.get(w, float('inf')):
+                    dist[w] = nd
+                    heapq.heappush(heap, (nd, w))
+        return dist
+
+    def shortcuts(self, v: int) -> List[Tuple[int, int, float]]:
+        ins, outs = self.inn[v], self.out[v]
+        found = []
+        if not ins or not outs:
+            return found
+        max_out = max(outs.values())
+        for u, cu in ins.items():
+            targets = {w: cu + cw for w, cw in outs.items() if w != u}
+            if not targets:
+                continue
+            dist = self._witness(u, v, targets, cu + max_out)
+            for w, c in targets.items():
+                if dist.get(w, float('inf')) > c:
+                    found.append((u, w, c))
+        return found
+
+    def priority(self, v: int) -> int:
+        return len(self.shortcuts(v)) - len(self.inn[v]) - len(self.out[v]) + self.deleted[v]
+
+    def contract(self, v: int):
+        for u, w, c in self.shortcuts(v):
+            if c < self.out[u].get(w, float('inf')):
+                self.out[u][w] = c
+                self.inn[w][u] = c
+                self.edges[(u, w)] = (c, v)
+        for u in self.inn[v]:
+            del self.out[u][v]
+            self.deleted[u] += 1
+        for w in self.out[v]:
+            del self.inn[w][v]
+            self.deleted[w] += 1
+        self.out[v] = {}
+        self.inn[v] = {}
+
+
+def build_ch(csr: CSRGraph, witness_limit: int = 50, progress: bool = False) -> CHGraph:
+    """Contract every node of ``csr`` and return the hierarchy."""
+    n = csr.num_nodes
+    ctr = _Contractor(csr, witness_limit)
+    heap = [(ctr.priority(v), v) for v in range(n)]
+    heapq.heapify(heap)
+    rank = np.zeros(n, dtype=np.int32)
+    order = 0
+    while heap:
+        _, v = heapq.heappop(heap)
+        # Lazy update: re-queue if the priority got worse
+        prio = ctr.priority(v)
+        if heap and prio > heap[0][0]:
+            heapq.heappush(heap, (prio, v))
+            continue
+        ctr.contract(v)
+        rank[v] = order
+        order += 1
+        if progress and order % 10000 == 0:
+            print(f"[CH] contracted {order}/{n} nodes, {len(ctr.edges)} edges")
+
+    src = np.fromiter((k[0] for k in ctr.edges), dtype=np.int64, count=len(ctr.edges))
+    dst = np.fromiter((k[1] for k in ctr.edges), dtype=np.int64, count=len(ctr.edges))
+    cost = np.fromiter((v[0] for v in ctr.edges.values()), dtype=np.float64, count=len(ctr.edges))
+    mid = np.fromiter((v[1] for v in ctr.edges.values()), dtype=np.int64, count=len(ctr.edges))
+    up = rank[src] < rank[dst]
+    up_offsets, up_targets, up_costs, up_mid = _group(n, src[up], dst[up], cost[up], mid[up])
+    down_offsets, down_sources, down_costs, down_mid = _group(n, dst[~up], src[~up], cost[~up], mid[~up])
+    return CHGraph(rank, up_offsets, up_targets, up_costs, up_mid,
+                   down_offsets, down_sources, down_costs, down_mid)
+
+
+def _group(n: int, key: np.ndarray, other: np.ndarray, cost: np.ndarray, mid: np.ndarray):
+    order = np.argsort(key, kind='stable')
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(key, minlength=n), out=offsets[1:])
+    return (offsets, other[order].astype(np.int32), cost[order].astype(np.float64),
+            mid[order].astype(np.int32))
+
+
+def save_ch(path: Path, ch: CHGraph, fingerprint: Optional[str]) -> Dict:
+    meta = {'nodes': ch.num_nodes, 'shortcuts': ch.num_shortcuts}
+    return write_snapshot(path, ch.to_arrays(), fingerprint, meta)
+
+
+def load_ch(path: Path, fingerprint: Optional[str] = None) -> Optional[CHGraph]:
+    """Open a serialized hierarchy; None if missing or built for another graph."""
+    arrays = open_matching(path, fingerprint, 'CH')
+    return CHGraph.from_arrays(arrays) if arrays is not None else None
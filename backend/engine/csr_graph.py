@@ -0,0 +1,180 @@
+from typing import Dict, List, Tuple, Iterator, Mapping, Optional
+import numpy as np
+
+Edge = Dict[str, float]
+Graph = Dict[str, List[Edge]]
+
+
+class CSRGraph:
+    """Compressed sparse row graph with integer node ids.
+
+    Edges of node ``i`` are ``targets[offsets[i]:offsets[i + 1]]`` with matching
+    ``costs``. ``coords[i]`` holds ``(lat, lon)`` of node ``i``.
+
+    Optional edge geometry: edge ``e`` follows ``geom_coords`` from index
+    ``geom_first[e]`` to ``geom_last[e]`` (inclusive, descending for reversed edges).
+    ``edge_road[e]`` is the ``roads.id`` the edge was built from, when known.
+    """
+
+    def __init__(self, offsets: np.ndarray, targets: np.ndarray, costs: np.ndarray, coords: np.ndarray,
+                 geom_first: Optional[np.ndarray] = None, geom_last: Optional[np.ndarray] = None,
+                 geom_coords: Optional[np.ndarray] = None, edge_road: Optional[np.ndarray] = None):
+        self.offsets = offsets
+        self.targets = targets
+        self.costs = costs
+        self.coords = coords
+        self.geom_first = geom_first
+        self.geom_last = geom_last
+        self.geom_coords = geom_coords
+        self.edge_road = edge_road
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def num_edges(self) -> int:
+        return len(self.targets)
+
+    def neighbors(self, node: int) -> Tuple[List[int], List[float]]:
+        lo, hi = self.offsets[node], self.offsets[node + 1]
+        return self.targets[lo:hi].tolist(), self.costs[lo:hi].tolist()
+
+    def with_costs(self, costs: np.ndarray) -> 'CSRGraph':
+        """Same graph with other edge costs; all other arrays are shared."""
+        return CSRGraph(self.offsets, self.targets, costs, self.coords,
+                        self.geom_first, self.geom_last, self.geom_coords, self.edge_road)
+
+    def coord(self, node: int) -> Tuple[float, float]:
+        lat, lon = self.coords[node].tolist()
+        return lat, lon
+
+    def edge_source(self, edge: int) -> int:
+        return int(np.searchsorted(self.offsets, edge, side='right')) - 1
+
+    def edge_geometry(self, edge: int) -> List[Tuple[float, float]]:
+        """Polyline of ``edge`` as ``(lat, lon)`` pairs, source node first."""
+        if self.geom_coords is None:
+            return [self.coord(self.edge_source(edge)), self.coord(int(self.targets[edge]))]
+        first, last = int(self.geom_first[edge]), int(self.geom_last[edge])
+        if first <= last:
+            pts = self.geom_coords[first:last + 1]
+        else:
+            pts = self.geom_coords[last:first + 1][::-1]
+        return [tuple(p) for p in pts.tolist()]
+
+    @classmethod
+    def from_edges(cls, num_nodes: int, src: np.ndarray, dst: np.ndarray, cost: np.ndarray, coords: np.ndarray,
+                   geom_first: Optional[np.ndarray] = None, geom_last: Optional[np.ndarray] = None,
+                   geom_coords: Optional[np.ndarray] = None, edge_road: Optional[np.ndarray] = None) -> 'CSRGraph':
+        # Stable sort keeps the input edge order within each node
+        order = np.argsort(src, kind='stable')
+        counts = np.bincount(src, minlength=num_nodes)
+        offsets = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        if geom_coords is not None:
+            geom_first = np.ascontiguousarray(geom_first[order], dtype=np.int64)
+            geom_last = np.ascontiguousarray(geom_last[order], dtype=np.int64)
+            geom_coords = np.ascontiguousarray(geom_coords, dtype=np.float64)
+        if edge_road is not None:
+            edge_road = np.ascontiguousarray(edge_road[order], dtype=np.int64)
+        return cls(
+            offsets,
+            np.ascontiguousarray(dst[order], dtype=np.int32),
+            np.ascontiguousarray(cost[order], dtype=np.float32),
+            np.ascontiguousarray(coords, dtype=np.float64),
+            geom_first, geom_last, geom_coords, edge_road,
+        )
+
+    @classmethod
+    def from_dict(cls, graph: Graph, node_index: Dict[Tuple[float, float], str]) -> 'CSRGraph':
+        # Node ids keep the builder's creation order, so "n<i>" maps to i
+        ids: Dict[str, int] = {}
+        coords: List[Tuple[float, float]] = []
+        for key, nid in node_index.items():
+            if nid not in ids:
+                ids[nid] = len(ids)
+                coords.append(key)
+        for nid in graph:
+            if nid not in ids:
+                ids[nid] = len(ids)
+                coords.append((float('nan'), float('nan')))
+        src: List[int] = []
+        dst: List[int] = []
+        cost: List[float] = []
+        for nid, edges in graph.items():
+            a = ids[nid]
+            for edge in edges:
+                if edge['to'] not in ids:
+                    continue
+                src.append(a)
+                dst.append(ids[edge['to']])
+                cost.append(edge['cost'])
+        return cls.from_edges(
+            len(ids),
+            np.asarray(src, dtype=np.int64),
+            np.asarray(dst, dtype=np.int64),
+            np.asarray(cost, dtype=np.float64),
+            np.asarray(coords, dtype=np.float64).reshape(-1, 2),
+        )
+
+    def edge_sources(self) -> np.ndarray:
+        return np.repeat(np.arange(self.num_nodes, dtype=np.int64), np.diff(self.offsets))
+
+    def reversed(self) -> 'CSRGraph':
+        """Graph with every edge flipped (geometry is not carried over)."""
+        return CSRGraph.from_edges(self.num_nodes, self.targets.astype(np.int64), self.edge_sources(),
+                                   self.costs, self.coords)
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        arrays = {'offsets': self.offsets, 'targets': self.targets, 'costs': self.costs, 'coords': self.coords}
+        if self.geom_coords is not None:
+            arrays.update(geom_first=self.geom_first, geom_last=self.geom_last, geom_coords=self.geom_coords)
+        if self.edge_road is not None:
+            arrays['edge_road'] = self.edge_road
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> 'CSRGraph':
+        return cls(
+            arrays['offsets'], arrays['targets'], arrays['costs'], arrays['coords'],
+            arrays.get('geom_first'), arrays.get('geom_last'), arrays.get('geom_coords'), arrays.get('edge_road'),
+        )
+
+    def as_dict(self) -> 'DictGraphView':
+        return DictGraphView(self)
+
+    def node_index(self) -> Dict[Tuple[float, float], str]:
+        return {(lat, lon): f"n{i}" for i, (lat, lon) in enumerate(self.coords.tolist())}
+
+
+class DictGraphView(Mapping):
+    """Read-only ``graph[node_id] = [{'to': ..., 'cost': ...}]`` view over a CSRGraph."""
+
+    def __init__(self, csr: CSRGraph):
+        self.csr = csr
+
+    def _index(self, nid: str) -> int:
+        if not isinstance(nid, str) or not nid.startswith('n') or not nid[1:].isdigit():
+            raise KeyError(nid)
+        i = int(nid[1:])
+        if i >= self.csr.num_nodes:
+            raise KeyError(nid)
+        return i
+
+    def __getitem__(self, nid: str) -> List[Edge]:
+        targets, costs = self.csr.neighbors(self._index(nid))
+        return [{'to': f"n{t}", 'cost': c} for t, c in zip(targets, costs)]
+
+    def __contains__(self, nid) -> bool:
+        try:
+            self._index(nid)
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self) -> Iterator[str]:
+        return (f"n{i}" for i in range(self.csr.num_nodes))
+
+    def __len__(self) -> int:
+        return self.csr.num_nodes
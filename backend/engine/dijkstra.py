@@ -0,0 +1,45 @@
+from typing import Dict, Iterable, Optional
+import heapq
+import numpy as np
+from .csr_graph import CSRGraph
+
+
+class SearchLimitExceeded(Exception):
+    """A search settled more nodes than its ``max_settled`` limit."""
+
+
+def one_to_all(csr: CSRGraph, sources: Dict[int, float], targets: Optional[Iterable[int]] = None,
+               max_settled: int = 0) -> np.ndarray:
+    """Plain Dijkstra from ``sources`` (node -> initial cost).
+
+    Returns a float64 distance per node, ``inf`` where unreachable. With
+    ``targets`` the search stops once all of them are settled. Raises
+    ``SearchLimitExceeded`` past ``max_settled`` nodes (0 = no limit).
+    """
+    best: Dict[int, float] = dict(sources)
+    settled: Dict[int, float] = {}
+    heap = [(c, n) for n, c in sources.items()]
+    heapq.heapify(heap)
+    remaining = set(targets) if targets is not None else None
+    while heap:
+        d, u = heapq.heappop(heap)
+        if u in settled or d > best[u]:
+            continue
+        settled[u] = d
+        if max_settled and len(settled) > max_settled:
+            raise SearchLimitExceeded(f"settled more than {max_settled} nodes")
+        if remaining is not None:
+            remaining.discard(u)
+            if not remaining:
+                break
+        nbrs, costs = csr.neighbors(u)
+        for w, c in zip(nbrs, costs):
+            nd = d + c
+            if nd < best.get(w, float('inf')):
+                best[w] = nd
+                heapq.heappush(heap, (nd, w))
+    dist = np.full(csr.num_nodes, np.inf)
+    if settled:
+        nodes = np.fromiter(settled.keys(), dtype=np.int64, count=len(settled))
+        dist[nodes] = np.fromiter(settled.values(), dtype=np.float64, count=len(settled))
+    return dist
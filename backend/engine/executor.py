@@ -0,0 +1,191 @@
+"""Execution layer: runs searches off the event loop with admission control.
+
+With ``ROUTE_WORKERS > 0`` and a snapshot-backed router, searches run in a
+process pool whose workers map the same snapshot file, so CPU-bound A*
+scales across cores without holding the API process's GIL. Otherwise they
+run in the event loop's default thread pool.
+"""
+from typing import Any, Callable, Dict, Optional
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+import asyncio
+import multiprocessing
+import os
+import time
+from .router import Router
+from .spatial_index import Snap
+
+
+class Overloaded(Exception):
+    """Too many requests in flight; the caller should retry later."""
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+_worker_router: Optional[Router] = None
+
+
+def _init_worker(snapshot_path: str, checksum: Optional[str], max_settled: int, overrides: Dict[int, float]):
+    global _worker_router
+    # Refuses a file that no longer holds the dispatching router's graph
+    _worker_router = Router.from_snapshot(snapshot_path, checksum=checksum, max_settled=max_settled)
+    if overrides:
+        _worker_router.apply_overrides(overrides)
+
+
+def worker_router() -> Router:
+    """Router of the current worker process."""
+    return _worker_router
+
+
+def _timed_route(router: Router, start: Snap, end: Snap, algorithm: str):
+    timings: Dict[str, float] = {}
+    stats: Dict[str, int] = {}
+    path = router.route_snaps(start, end, algorithm, timings, stats)
+    return path, timings, stats
+
+
+def _route_task(start: Snap, end: Snap, algorithm: str):
+    return _timed_route(_worker_router, start, end, algorithm)
+
+
+class RouteExecutor:
+    def __init__(self, router: Router, workers: Optional[int] = None, max_queue: Optional[int] = None,
+                 timeout: Optional[float] = None):
+        self.workers = int(os.getenv('ROUTE_WORKERS', '0')) if workers is None else workers
+        self.max_queue = int(os.getenv('ROUTE_MAX_QUEUE', '64')) if max_queue is None else max_queue
+        self.timeout = float(os.getenv('ROUTE_TIMEOUT_S', '10')) if timeout is None else timeout
+        # (router, pool) swapped as one tuple so readers never mix graphs
+        self.active = (router, self._start_pool(router))
+        # Own thread pool, so a timed-out search still holds its slot until it returns
+        self._threads = ThreadPoolExecutor(thread_name_prefix='route')
+        self.in_flight = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+    @property
+    def router(self) -> Router:
+        return self.active[0]
+
+    @property
+    def pool(self) -> Optional[ProcessPoolExecutor]:
+        return self.active[1]
+
+    def _start_pool(self, router: Router) -> Optional[ProcessPoolExecutor]:
+        if self.workers > 0 and router.snapshot_path:
+            return ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(router.snapshot_path, router.snapshot_checksum, router.max_settled,
+                          dict(router.overrides)),
+            )
+        if self.workers > 0:
+            print("[Executor] Router has no snapshot file, running searches in threads")
+        return None
+
+    def swap(self, router: Router):
+        """Serve new requests from ``router``; call on the event loop thread.
+
+        Workers restart on the router's snapshot and overrides. Searches
+        already running finish on the old pool, which mapped the old file.
+        """
+        old = self.pool
+        self.active = (router, self._start_pool(router))
+        if old is not None:
+            old.shutdown(wait=False)
+
+    @property
+    def capacity(self) -> int:
+        return max(self.workers, 1) + self.max_queue
+
+    def _release(self, slots: int):
+        self.in_flight -= slots
+
+    def _submit(self, pool: Executor, fn: Callable, *args, slots: int = 1) -> asyncio.Future:
+        """Submit ``fn(*args)`` under admission control, holding ``slots`` slots.
+
+        The slots are freed when the work itself finishes, not when the caller
+        stops waiting for it.
+        """
+        # Runs on the event loop thread only, so a plain counter is enough
+        if self.in_flight + slots > self.capacity:
+            self.rejected += 1
+            raise Overloaded(f"{self.in_flight} requests in flight")
+        loop = asyncio.get_running_loop()
+        future = pool.submit(fn, *args)
+        self.in_flight += slots
+
+        def done(_):
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(self._release, slots)
+        future.add_done_callback(done)
+        return asyncio.wrap_future(future)
+
+    async def _run(self, future: asyncio.Future, timeout: Optional[float]) -> Any:
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            # A running search goes on until its settled-node limit and keeps its slot
+            self.timeouts += 1
+            raise SearchTimeout(f"search exceeded {timeout}s")
+
+    async def route(self, start_lat: float, start_lon: float, end_lat: float, end_lon: float,
+                    algorithm: Optional[str] = None, timings: Optional[Dict[str, float]] = None,
+                    stats: Optional[Dict[str, int]] = None):
+        """Like ``Router.route``; ``timings`` also gets ``dispatch``, the pool overhead around the search."""
+        # Snapping and cache lookups are cheap and stay on the event loop;
+        # cache hits never take a worker slot
+        router, pool = self.active
+        timings = {} if timings is None else timings
+        algorithm = router.check_algorithm(algorithm)
+        t0 = time.perf_counter()
+        start = router.snap(start_lat, start_lon)
+        end = router.snap(end_lat, end_lon)
+        t1 = time.perf_counter()
+        timings['snap'] = t1 - t0
+        if start is None or end is None:
+            return []
+        path = router.cached_route(start, end, algorithm)
+        t0 = time.perf_counter()
+        timings['cache'] = t0 - t1
+        if path is not None:
+            return path
+        # A path found against costs that change mid-search must not be cached
+        generation = router.cache_generation
+        if pool is not None:
+            future = self._submit(pool, _route_task, start, end, algorithm)
+        else:
+            future = self._submit(self._threads, _timed_route, router, start, end, algorithm)
+        path, search_timings, search_stats = await self._run(future, self.timeout)
+        timings.update(search_timings)
+        timings['dispatch'] = max(0.0, time.perf_counter() - t0 - sum(search_timings.values()))
+        if stats is not None:
+            stats.update(search_stats)
+        router.store_route(start, end, algorithm, path, generation)
+        return path
+
+    async def call(self, fn: Callable, *args, timeout: Optional[float] = None, slots: int = 1) -> Any:
+        """Run ``fn(*args)`` in a thread under the same admission control.
+
+        Work that fans out to the process pool itself passes one slot per
+        task it keeps there, so routes queued behind it are still counted.
+        """
+        return await self._run(self._submit(self._threads, fn, *args, slots=slots), timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers if self.pool is not None else 0,
+            "in_flight": self.in_flight,
+            "capacity": self.capacity,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+        }
+
+    def shutdown(self):
+        router, pool = self.active
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+            self.active = (router, None)
+        self._threads.shutdown(wait=False, cancel_futures=True)
@@ -1,41 +1,44 @@
-from typing import Dict, List, Tuple, Any
-import json
+from typing import Dict, List, Tuple, Optional, Any
 import psycopg2
 import os
-import pickle
 from pathlib import Path
-from .heuristics import haversine
-
-Graph = Dict[str, List[Dict[str, float]]]
+import numpy as np
+from .heuristics import haversine_np
+from .csr_graph import CSRGraph, Graph
+from .spatial_index import GridIndex
+from .snapshot import SnapshotError, load_graph, resolve_snapshot, save_graph
+from .wkb import parse_lines
 
 class GraphBuilder:
     def __init__(self):
         self.graph: Graph = {}
         self.node_index: Dict[Tuple[float, float], str] = {}
-        self.next_id = 0
-        self._cache_path = Path(os.getenv('GRAPH_CACHE_PATH', 'backend/data/graph_cache.pkl'))
+        self.snapshot_path = Path(os.getenv('GRAPH_SNAPSHOT_PATH', 'backend/data/graph.pfg'))
+        # Versioned file behind snapshot_path that was loaded; never replaced in place
+        self.snapshot_file: Optional[Path] = None
+        # Graph served from memory after a failed snapshot write
+        self._unsaved: Optional[CSRGraph] = None
+        self.snapshot_header: Optional[Dict[str, Any]] = None
+        self.index: Optional[GridIndex] = None
+        # Way layout of the current snapshot, needed for incremental updates
+        self.way_offsets: Optional[np.ndarray] = None
+        self.way_ids: Optional[np.ndarray] = None
+        self._batch_size = int(os.getenv('GRAPH_BATCH_SIZE', '50000'))
         self._conn = None
 
-    def _node_id(self, lat: float, lon: float) -> str:
-        key = (lat, lon)
-        if key in self.node_index:
-            return self.node_index[key]
-        nid = f"n{self.next_id}"
-        self.next_id += 1
-        self.node_index[key] = nid
-        self.graph.setdefault(nid, [])
-        return nid
+    def _connect(self):
+        return psycopg2.connect(
+            host=os.getenv('PGHOST', 'localhost'),
+            port=os.getenv('PGPORT', '5432'),
+            user=os.getenv('PGUSER', 'postgres'),
+            password=os.getenv('PGPASSWORD', ''),
+            dbname=os.getenv('PGDATABASE', 'osm')
+        )
 
-    def build(self) -> Graph:
-        # Check if 'roads' table exists, if not, run roads.sql to create it
+    def _check_roads(self) -> Optional[str]:
+        """Create the roads table if needed; returns its fingerprint or None."""
         try:
-            conn = psycopg2.connect(
-                host=os.getenv('PGHOST', 'localhost'),
-                port=os.getenv('PGPORT', '5432'),
-                user=os.getenv('PGUSER', 'postgres'),
-                password=os.getenv('PGPASSWORD', ''),
-                dbname=os.getenv('PGDATABASE', 'osm')
-            )
+            conn = self._connect()
             with conn.cursor() as cur:
                 cur.execute("SELECT to_regclass('roads');")
                 exists = cur.fetchone()[0]
@@ -46,69 +49,289 @@ class GraphBuilder:
                     cur.execute(sql)
                     conn.commit()
                     print("[GraphBuilder] 'roads' table created.")
-                else:
-                    cur.execute("SELECT COUNT(*) FROM roads;")
-                    count = cur.fetchone()[0]
-                    print(f"[GraphBuilder] Number of rows in roads table: {count}")
+                cur.execute("SELECT COUNT(*), COALESCE(MAX(id), 0) FROM roads;")
+                count, max_id = cur.fetchone()
+                print(f"[GraphBuilder] Number of rows in roads table: {count}")
             conn.close()
+            return f"roads:{count}:{max_id}"
         except Exception as e:
             print(f"[GraphBuilder] Failed to check or create roads table: {e}")
+            return None
+
+    def _load_snapshot(self, fingerprint: Optional[str]) -> Optional[CSRGraph]:
+        if not self.snapshot_path.exists():
+            return None
+        try:
+            # Resolve once so the file loaded is the one handed to workers
+            path = resolve_snapshot(self.snapshot_path)
+            csr, index, arrays, header = load_graph(path)
+        except (OSError, ValueError, KeyError, SnapshotError) as e:
+            print(f"[GraphBuilder] Failed to load snapshot: {e}")
+            return None
+        # Without a database connection the snapshot is used as is
+        if fingerprint and header.get('fingerprint') != fingerprint:
+            print(f"[GraphBuilder] Snapshot is stale ({header.get('fingerprint')} != {fingerprint})")
+            return None
+        self.index = index
+        self.way_offsets = arrays.get('way_offsets')
+        self.way_ids = arrays.get('way_ids')
+        self.snapshot_header = header
+        self.snapshot_file = path
+        return csr
+
+    def _save_snapshot(self, csr: CSRGraph, fingerprint: Optional[str], way_offsets: np.ndarray,
+                       way_ids: np.ndarray, change_id: Optional[int] = None) -> bool:
+        """Write and publish a snapshot of ``csr``; returns False if it could not be written."""
+        index = GridIndex(csr.coords, float(os.getenv('SNAP_CELL_DEG', '0.01')))
+        index.index_edges(csr)
+        extra = {'way_offsets': way_offsets, 'way_ids': way_ids}
+        meta = {'change_id': change_id} if change_id is not None else None
+        try:
+            header = save_graph(self.snapshot_path, csr, index, fingerprint, extra, meta, versioned=True)
+        except OSError as e:
+            print(f"[GraphBuilder] Failed to write snapshot: {e}")
+            return False
+        self.snapshot_header = header
+        self.snapshot_file = resolve_snapshot(self.snapshot_path)
+        self.index = index
+        self._unsaved = None
+        return True
+
+    def _serve_unsaved(self, csr: CSRGraph, way_offsets: np.ndarray, way_ids: np.ndarray,
+                       change_id: Optional[int]) -> CSRGraph:
+        # No file backs this graph: workers fall back to threads and updates start from memory
+        print("[GraphBuilder] Serving the graph from memory without a snapshot")
+        self.index = GridIndex(csr.coords, float(os.getenv('SNAP_CELL_DEG', '0.01')))
+        self.way_offsets = way_offsets
+        self.way_ids = way_ids
+        self.snapshot_header = {'checksum': None, 'meta': {'change_id': change_id}}
+        self.snapshot_file = None
+        self._unsaved = csr
+        return csr
 
-        # Try loading graph from cache
-        if self._cache_path.exists():
-            try:
-                with self._cache_path.open('rb') as f:
-                    cache = pickle.load(f)
-                self.graph = cache.get('graph', {})
-                self.node_index = cache.get('node_index', {})
-                self.next_id = cache.get('next_id', len(self.node_index))
-                return self.graph
-            except Exception as e:
-                print(f"[GraphBuilder] Failed to load cache: {e}")
-
-        # Connect to database if cache is not available
+    def _read_ways(self, road_ids: Optional[List[int]] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Stream road geometries in batches, optionally only ``road_ids``.
+
+        Returns all way vertices as one ``(P, 2)`` lon/lat array, the
+        ``(W + 1)`` offsets of each way into it and the road id of each way.
+        """
         if not self._conn:
-            self._conn = psycopg2.connect(
-                host=os.getenv('PGHOST', 'localhost'),
-                port=os.getenv('PGPORT', '5432'),
-                user=os.getenv('PGUSER', 'postgres'),
-                password=os.getenv('PGPASSWORD', ''),
-                dbname=os.getenv('PGDATABASE', 'osm')
-            )
-        cur = self._conn.cursor()
-
-        # Fetch road geometries from planet_osm_roads table
-        cur.execute("SELECT id, ST_AsGeoJSON(geom) FROM roads;")
-        rows = cur.fetchall()
-        for road_id, geojson in rows:
-            data = json.loads(geojson)
-            if data.get('type') != 'LineString':
-                continue
-            coords: List[List[float]] = data.get('coordinates', [])
-            if len(coords) < 2:
-                continue
-            start = coords[0]
-            end = coords[-1]
-            lon1, lat1 = start
-            lon2, lat2 = end
-            a = self._node_id(lat1, lon1)
-            b = self._node_id(lat2, lon2)
-            dist = haversine(lat1, lon1, lat2, lon2)
-            self.graph[a].append({'to': b, 'cost': dist})
-            self.graph[b].append({'to': a, 'cost': dist})
+            self._conn = self._connect()
+        # Named cursor keeps the result set on the server
+        cur = self._conn.cursor(name='pathforge_roads')
+        cur.itersize = self._batch_size
+        if road_ids is None:
+            cur.execute("SELECT id, ST_AsBinary(geom) FROM roads;")
+        else:
+            cur.execute("SELECT id, ST_AsBinary(geom) FROM roads WHERE id = ANY(%s);", (list(road_ids),))
+        chunks: List[np.ndarray] = []
+        lengths: List[int] = []
+        ids: List[int] = []
+        while True:
+            rows = cur.fetchmany(self._batch_size)
+            if not rows:
+                break
+            batch: List[np.ndarray] = []
+            for road_id, wkb in rows:
+                if wkb is None:
+                    continue
+                for line in parse_lines(wkb):
+                    if len(line) < 2:
+                        continue
+                    batch.append(line)
+                    lengths.append(len(line))
+                    ids.append(road_id)
+            if batch:
+                # One array per batch keeps the Python object count low
+                chunks.append(np.concatenate(batch))
         cur.close()
+        self._conn.commit()
+        points = np.concatenate(chunks) if chunks else np.zeros((0, 2))
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        return points, offsets, np.asarray(ids, dtype=np.int64)
+
+    def _last_change_id(self) -> Optional[int]:
+        if not self._conn:
+            self._conn = self._connect()
+        try:
+            with self._conn.cursor() as cur:
+                cur.execute("SELECT COALESCE(MAX(id), 0) FROM road_changes;")
+                change_id = cur.fetchone()[0]
+            self._conn.commit()
+            return change_id
+        except psycopg2.Error:
+            # No change log installed
+            self._conn.rollback()
+            return None
+
+    def read_changes(self) -> Tuple[List[int], List[int], Optional[int]]:
+        """Road ids changed since the snapshot, from the ``road_changes`` log.
+
+        Returns ``(upserted, deleted, last_change_id)``; the last operation per
+        road wins. See ``scripts/road_changes.sql``.
+        """
+        after = (self.snapshot_header or {}).get('meta', {}).get('change_id') or 0
+        if not self._conn:
+            self._conn = self._connect()
+        with self._conn.cursor() as cur:
+            cur.execute("SELECT id, road_id, op FROM road_changes WHERE id > %s ORDER BY id;", (after,))
+            rows = cur.fetchall()
+        self._conn.commit()
+        last: Dict[int, str] = {}
+        for _, road_id, op in rows:
+            last[road_id] = op
+        upserted = [r for r, op in last.items() if op != 'D']
+        deleted = [r for r, op in last.items() if op == 'D']
+        return upserted, deleted, (rows[-1][0] if rows else None)
 
-        # Persist cache
+    def update_roads(self, upserted: List[int], deleted: List[int], change_id: Optional[int] = None) -> CSRGraph:
+        """Rebuild the graph with ``upserted`` roads re-read and ``deleted`` roads removed.
+
+        Only the changed roads are read from the database; every other way
+        comes from the current snapshot, whose geometry holds all way
+        vertices back to back. Snapshots without way ids get a full rebuild.
+        """
+        csr = self._unsaved if self._unsaved is not None else self._load_snapshot(None)
+        if csr is None or self.way_ids is None or csr.geom_coords is None:
+            print("[GraphBuilder] Snapshot has no road ids, running a full rebuild")
+            return self.build_csr(force=True)
+        if change_id is None:
+            change_id = self.snapshot_header['meta'].get('change_id')
+        changed = np.asarray(list(upserted) + list(deleted), dtype=np.int64)
+        keep = ~np.isin(self.way_ids, changed)
+        lengths = np.diff(self.way_offsets)
+        points = csr.geom_coords[np.repeat(keep, lengths)][:, ::-1]
+        ids = self.way_ids[keep]
+        lengths = lengths[keep]
+        if upserted:
+            new_points, new_offsets, new_ids = self._read_ways(list(upserted))
+            points = np.concatenate([points, new_points])
+            ids = np.concatenate([ids, new_ids])
+            lengths = np.concatenate([lengths, np.diff(new_offsets)])
+        way_offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=way_offsets[1:])
+        csr = self._build_from_ways(points, way_offsets, ids)
+        print(f"[GraphBuilder] Applied {len(upserted)} upserted / {len(deleted)} deleted roads: "
+              f"nodes={csr.num_nodes} edges={csr.num_edges}")
+        if not self._save_snapshot(csr, self._check_roads(), way_offsets, ids, change_id):
+            # The old snapshot is still published; reloading it would silently drop this update
+            raise SnapshotError("could not write the updated snapshot")
+        return self._load_snapshot(None) or csr
+
+    def _build_from_ways(self, points: np.ndarray, way_offsets: np.ndarray,
+                         way_ids: Optional[np.ndarray] = None) -> CSRGraph:
+        """Split ways at every shared vertex and build the CSR graph.
+
+        ``points`` holds the lon/lat vertices of all ways back to back;
+        ``way_ids`` (road id per way) is carried onto the edges.
+        """
+        geom = np.ascontiguousarray(points[:, ::-1], dtype=np.float64)
+        if len(geom) == 0:
+            return CSRGraph.from_edges(0, np.zeros(0, np.int64), np.zeros(0, np.int64), np.zeros(0),
+                                       np.zeros((0, 2)), np.zeros(0, np.int64), np.zeros(0, np.int64), geom,
+                                       None if way_ids is None else np.zeros(0, np.int64))
+        # Identical coordinates are the same vertex
+        keys = np.ascontiguousarray(geom).view(np.complex128).ravel()
+        uniq, vertex, counts = np.unique(keys, return_inverse=True, return_counts=True)
+        vertex = vertex.ravel()
+
+        # Junctions: way ends and vertices used more than once
+        is_junction = counts[vertex] > 1
+        is_junction[way_offsets[:-1]] = True
+        is_junction[way_offsets[1:] - 1] = True
+        junction_vertices = np.unique(vertex[is_junction])
+        node_of_vertex = np.full(len(uniq), -1, dtype=np.int64)
+        node_of_vertex[junction_vertices] = np.arange(len(junction_vertices))
+        coords = np.column_stack([uniq[junction_vertices].real, uniq[junction_vertices].imag])
+
+        # Cumulative length along the point array (reset meaning at way borders)
+        way_of_point = np.repeat(np.arange(len(way_offsets) - 1), np.diff(way_offsets))
+        seg = np.zeros(len(geom))
+        same_way = way_of_point[1:] == way_of_point[:-1]
+        lengths = haversine_np(geom[:-1, 0], geom[:-1, 1], geom[1:, 0], geom[1:, 1])
+        seg[1:] = np.where(same_way, lengths, 0.0)
+        cum = np.cumsum(seg)
+
+        # Edges run between consecutive junction points of the same way
+        jpos = np.flatnonzero(is_junction)
+        first, last = jpos[:-1], jpos[1:]
+        keep = way_of_point[first] == way_of_point[last]
+        first, last = first[keep], last[keep]
+        a = node_of_vertex[vertex[first]]
+        b = node_of_vertex[vertex[last]]
+        cost = cum[last] - cum[first]
+        keep = a != b
+        a, b, cost, first, last = a[keep], b[keep], cost[keep], first[keep], last[keep]
+        road = None
+        if way_ids is not None:
+            road = way_ids[way_of_point[first]]
+            road = np.concatenate([road, road])
+
+        return CSRGraph.from_edges(
+            len(coords),
+            np.concatenate([a, b]),
+            np.concatenate([b, a]),
+            np.concatenate([cost, cost]),
+            coords,
+            np.concatenate([first, last]),
+            np.concatenate([last, first]),
+            geom,
+            road,
+        )
+
+    def _catch_up(self) -> Optional[CSRGraph]:
+        """Replay the ``road_changes`` log onto a stale snapshot; None when only a full rebuild can help."""
+        csr = self._load_snapshot(None)
+        if csr is None or self.way_ids is None or csr.geom_coords is None:
+            return None
+        # Snapshots built without the change log installed cannot be replayed
+        if self.snapshot_header['meta'].get('change_id') is None:
+            return None
         try:
-            self._cache_path.parent.mkdir(parents=True, exist_ok=True)
-            with self._cache_path.open('wb') as f:
-                pickle.dump({
-                    'graph': self.graph,
-                    'node_index': self.node_index,
-                    'next_id': self.next_id
-                }, f)
-        except Exception:
-            pass
+            upserted, deleted, change_id = self.read_changes()
+            if change_id is None:
+                # Roads changed without being logged
+                return None
+            print(f"[GraphBuilder] Replaying {len(upserted) + len(deleted)} logged road changes")
+            return self.update_roads(upserted, deleted, change_id)
+        except (psycopg2.Error, SnapshotError) as e:
+            print(f"[GraphBuilder] Could not replay road changes: {e}")
+            if self._conn:
+                self._conn.rollback()
+            return None
+
+    def build_csr(self, force: bool = False) -> CSRGraph:
+        fingerprint = self._check_roads()
+
+        # Try the memory-mapped snapshot first, then catch it up from the change log
+        if not force:
+            csr = self._load_snapshot(fingerprint)
+            if csr is not None:
+                return csr
+            if fingerprint:
+                csr = self._catch_up()
+                if csr is not None:
+                    return csr
+            print("[GraphBuilder] Running a full rebuild")
+
+        # Changes logged after this point are replayed by the next update
+        change_id = self._last_change_id()
+        points, way_offsets, way_ids = self._read_ways()
+        print(f"[GraphBuilder] Read {len(way_offsets) - 1} ways, {len(points)} vertices")
+        csr = self._build_from_ways(points, way_offsets, way_ids)
+        print(f"[GraphBuilder] Built graph: nodes={csr.num_nodes} edges={csr.num_edges}")
+
+        # Persist snapshot and serve from the mapped copy
+        if not self._save_snapshot(csr, fingerprint, way_offsets, way_ids, change_id):
+            return self._serve_unsaved(csr, way_offsets, way_ids, change_id)
+        return self._load_snapshot(None) or csr
+
+    def build(self) -> Graph:
+        # Dict-style graph for existing callers
+        csr = self.build_csr()
+        self.graph = csr.as_dict()
+        self.node_index = csr.node_index()
         return self.graph
 
     def close(self):
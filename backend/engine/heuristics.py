@@ -1,8 +1,15 @@
 import math
+from typing import Callable
+import numpy as np
+
+R = 6371000.0
+METERS_PER_DEG = R * math.pi / 180.0
+# Largest relative overestimate of equirectangular() vs haversine() for spans up to
+# 100 km below 70 degrees latitude (see backend/tests/test_heuristics.py)
+EQUIRECT_MAX_REL_ERROR = 1e-4
 
 def haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     # Returns distance in meters
-    R = 6371000.0
     phi1 = math.radians(lat1)
     phi2 = math.radians(lat2)
     dphi = math.radians(lat2 - lat1)
@@ -10,3 +17,55 @@ def haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     a = math.sin(dphi/2)**2 + math.cos(phi1)*math.cos(phi2)*math.sin(dlambda/2)**2
     c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
     return R * c
+
+def haversine_np(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Vectorized haversine in meters; arguments broadcast like NumPy arrays."""
+    phi1 = np.radians(lat1)
+    phi2 = np.radians(lat2)
+    dphi = np.radians(np.subtract(lat2, lat1))
+    dlambda = np.radians(np.subtract(lon2, lon1))
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2) ** 2
+    return R * 2 * np.arctan2(np.sqrt(a), np.sqrt(np.maximum(1 - a, 0.0)))
+
+def equirectangular_np(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Equirectangular distance in meters: one cosine per pair instead of haversine's trigonometry.
+
+    Overestimates haversine by at most ``EQUIRECT_MAX_REL_ERROR`` at routing
+    distances; it never underestimates by more than floating point noise.
+    """
+    dx = np.subtract(lon2, lon1) * np.cos(np.radians(np.add(lat1, lat2) / 2))
+    dy = np.subtract(lat2, lat1)
+    return METERS_PER_DEG * np.hypot(dx, dy)
+
+class PlanarLowerBound:
+    """A* heuristic: equirectangular distance with one longitude scale per graph.
+
+    Longitude is scaled by the cosine of the graph's largest absolute
+    latitude and the result is shrunk by the equirectangular error bound for
+    the graph's extent (it grows with the square of the span). The
+    straight-line distance therefore stays below haversine, and below any
+    road length. Nodes are read from ``coords`` on demand, so a mapped
+    snapshot costs no private memory per worker.
+    """
+
+    def __init__(self, coords: np.ndarray):
+        self.coords = coords
+        max_lat = float(np.abs(coords[:, 0]).max()) if len(coords) else 0.0
+        extent = 0.0
+        if len(coords):
+            lo, hi = coords.min(axis=0), coords.max(axis=0)
+            extent = float(haversine_np(lo[0], lo[1], hi[0], hi[1]))
+        error = EQUIRECT_MAX_REL_ERROR * max(1.0, (extent / 100e3) ** 2)
+        scale = METERS_PER_DEG * (1.0 - min(error, 0.5))
+        self.kx = scale * math.cos(math.radians(min(max_lat, 89.0)))
+        self.ky = scale
+
+    def to(self, lat: float, lon: float) -> Callable[[int], float]:
+        """Heuristic ``node -> meters`` towards ``(lat, lon)``."""
+        kx, ky = self.kx, self.ky
+        item = self.coords.item
+        hypot = math.hypot
+
+        def heuristic(node: int) -> float:
+            return hypot((item(node, 1) - lon) * kx, (item(node, 0) - lat) * ky)
+        return heuristic
@@ -0,0 +1,119 @@
+"""ALT (A*, landmarks, triangle inequality) lower bounds.
+
+For a landmark ``L`` and target ``t``: ``d(v, t) >= d(L, t) - d(L, v)`` and
+``d(v, t) >= d(v, L) - d(t, L)``; the heuristic is the largest such bound.
+
+Landmark distances take two Dijkstra runs per landmark, so they are built
+offline (``backend/tools/build_landmarks.py``) and loaded by checksum like CH.
+"""
+from typing import Dict, List, Optional
+import random
+from pathlib import Path
+import numpy as np
+from .csr_graph import CSRGraph
+from .dijkstra import one_to_all
+from .snapshot import write_snapshot, open_matching
+
+
+class Landmarks:
+    def __init__(self, nodes: np.ndarray, dist_from: np.ndarray, dist_to: np.ndarray):
+        self.nodes = nodes
+        # (N, L): distances from / to each landmark, row per graph node
+        self.dist_from = dist_from
+        self.dist_to = dist_to
+
+    @property
+    def count(self) -> int:
+        return len(self.nodes)
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {'lm_nodes': self.nodes, 'lm_from': self.dist_from, 'lm_to': self.dist_to}
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> Optional['Landmarks']:
+        if 'lm_nodes' not in arrays:
+            return None
+        return cls(arrays['lm_nodes'], arrays['lm_from'], arrays['lm_to'])
+
+    def heuristic(self, targets: Dict[int, float], active: int = 4) -> 'LandmarkHeuristic':
+        return LandmarkHeuristic(self, targets, active)
+
+
+class LandmarkHeuristic:
+    """Lower bound to the nearest of several targets (node -> remaining cost)."""
+
+    def __init__(self, landmarks: Landmarks, targets: Dict[int, float], active: int):
+        self.dist_from = landmarks.dist_from
+        self.dist_to = landmarks.dist_to
+        self.active = active
+        # Per target: remaining cost and its landmark distances
+        self.targets = [(extra, self.dist_from[t].tolist(), self.dist_to[t].tolist()) for t, extra in targets.items()]
+        self.cols = list(range(landmarks.count))
+
+    def _estimate(self, row_from: List[float], row_to: List[float], cols: List[int]) -> float:
+        # nan (inf - inf) never compares greater, so unknown bounds drop out
+        best = float('inf')
+        for extra, t_from, t_to in self.targets:
+            h = 0.0
+            for c in cols:
+                a = t_from[c] - row_from[c]
+                if a > h:
+                    h = a
+                b = row_to[c] - t_to[c]
+                if b > h:
+                    h = b
+            if h + extra < best:
+                best = h + extra
+        return best
+
+    def select(self, source: int):
+        """Keep the ``active`` landmarks with the best bound at ``source``."""
+        if self.active >= len(self.cols):
+            return
+        row_from, row_to = self.dist_from[source].tolist(), self.dist_to[source].tolist()
+        ranked = sorted(self.cols, key=lambda c: self._estimate(row_from, row_to, [c]), reverse=True)
+        self.cols = ranked[:self.active]
+
+    def __call__(self, node: int) -> float:
+        return self._estimate(self.dist_from[node].tolist(), self.dist_to[node].tolist(), self.cols)
+
+
+def select_landmarks(csr: CSRGraph, count: int, seed: int = 0) -> List[int]:
+    """Farthest-point selection: each landmark is the node farthest from the previous ones."""
+    if csr.num_nodes == 0 or count <= 0:
+        return []
+    start = random.Random(seed).randrange(csr.num_nodes)
+    dist = one_to_all(csr, {start: 0.0})
+    chosen: List[int] = []
+    for _ in range(min(count, csr.num_nodes)):
+        # Unreached nodes first, so other components get a landmark too
+        unreached = np.flatnonzero(np.isinf(dist))
+        unreached = unreached[~np.isin(unreached, chosen)]
+        node = int(unreached[0]) if len(unreached) else int(np.argmax(dist))
+        if node in chosen:
+            break
+        chosen.append(node)
+        dist = one_to_all(csr, {n: 0.0 for n in chosen})
+    return chosen
+
+
+def build_landmarks(csr: CSRGraph, count: int = 8, seed: int = 0) -> Landmarks:
+    nodes = select_landmarks(csr, count, seed)
+    rev = csr.reversed()
+    dist_from = np.empty((csr.num_nodes, len(nodes)), dtype=np.float32)
+    dist_to = np.empty((csr.num_nodes, len(nodes)), dtype=np.float32)
+    for i, node in enumerate(nodes):
+        dist_from[:, i] = one_to_all(csr, {node: 0.0})
+        dist_to[:, i] = one_to_all(rev, {node: 0.0})
+    return Landmarks(np.asarray(nodes, dtype=np.int64), dist_from, dist_to)
+
+
+def save_landmarks(path: Path, landmarks: Landmarks, fingerprint: Optional[str]) -> Dict:
+    meta = {'nodes': len(landmarks.dist_from), 'landmarks': landmarks.count}
+    return write_snapshot(path, landmarks.to_arrays(), fingerprint, meta)
+
+
+def load_landmarks(path: Path, fingerprint: Optional[str] = None) -> Optional[Landmarks]:
+    """Open serialized landmarks; None if missing or built for another graph."""
+    arrays = open_matching(path, fingerprint, 'ALT')
+    return Landmarks.from_arrays(arrays) if arrays is not None else None
@@ -0,0 +1,108 @@
+"""Many-to-many travel cost tables: one Dijkstra per source over the router graph."""
+from typing import List, Optional, Tuple
+import os
+import time
+import numpy as np
+from .dijkstra import one_to_all
+from .executor import RouteExecutor, SearchTimeout, worker_router
+from .router import Router
+from .spatial_index import Snap
+
+
+def snap_points(router: Router, points: List[Tuple[float, float]]) -> List[Optional[Snap]]:
+    return [router.snap(lat, lon) for lat, lon in points]
+
+
+def cost_row(router: Router, source: Optional[Snap], targets: List[Optional[Snap]]) -> np.ndarray:
+    """Costs from one snapped source to every snapped target (inf if unreachable)."""
+    row = np.full(len(targets), np.inf)
+    if source is None:
+        return row
+    # One graph for the whole row, even if overrides swap router.csr meanwhile
+    csr = router.csr
+    wanted = [router._targets(t, csr) if t is not None else {} for t in targets]
+    nodes = {n for w in wanted for n in w}
+    dist = one_to_all(csr, router._sources(source, csr), nodes, router.max_settled)
+    for j, (target, remaining) in enumerate(zip(targets, wanted)):
+        if target is None:
+            continue
+        if source.edge >= 0 and source.edge == target.edge and target.t >= source.t:
+            # Same edge, in travel direction
+            row[j] = (target.t - source.t) * float(csr.costs[source.edge])
+            continue
+        for node, extra in remaining.items():
+            row[j] = min(row[j], dist[node] + extra)
+    return row
+
+
+def _rows(router: Router, sources: List[Optional[Snap]], targets: List[Optional[Snap]],
+          deadline: Optional[float]) -> np.ndarray:
+    rows = []
+    for source in sources:
+        # Checked per row so an abandoned matrix stops working soon after its timeout
+        if deadline is not None and time.time() > deadline:
+            raise SearchTimeout("matrix exceeded its deadline")
+        rows.append(cost_row(router, source, targets))
+    return np.vstack(rows)
+
+
+def _worker_rows(sources: List[Optional[Snap]], targets: List[Optional[Snap]], deadline: Optional[float]) -> np.ndarray:
+    return _rows(worker_router(), sources, targets, deadline)
+
+
+def _parallel(executor: Optional[RouteExecutor], rows: int) -> bool:
+    return (executor is not None and executor.pool is not None
+            and rows >= int(os.getenv('MATRIX_PARALLEL_MIN_ROWS', '16')))
+
+
+def matrix_slots(executor: RouteExecutor, rows: int) -> int:
+    """Admission slots a matrix with ``rows`` sources holds: one per chunk it keeps in the pool."""
+    return executor.workers if _parallel(executor, rows) else 1
+
+
+def _pool_rows(pool, sources: List[Optional[Snap]], targets: List[Optional[Snap]],
+               deadline: Optional[float], chunk: int, window: int) -> np.ndarray:
+    parts = []
+    for i in range(0, len(sources), chunk):
+        # At most ``window`` chunks queued at once, so routes get a worker between chunks
+        if len(parts) >= window:
+            parts[-window].result()
+        parts.append(pool.submit(_worker_rows, sources[i:i + chunk], targets, deadline))
+    return np.vstack([p.result() for p in parts])
+
+
+def distance_matrix(router: Router, sources: List[Optional[Snap]], targets: List[Optional[Snap]],
+                    executor: Optional[RouteExecutor] = None, deadline: Optional[float] = None) -> np.ndarray:
+    """Dense ``(len(sources), len(targets))`` cost matrix in meters.
+
+    With an executor that owns a worker pool, matrices with at least
+    ``MATRIX_PARALLEL_MIN_ROWS`` sources are split across its processes,
+    with at most one chunk per worker in the pool at a time (see
+    ``matrix_slots``).
+    Each row is limited to the router's ``max_settled`` nodes; past the
+    ``time.time()`` ``deadline`` no further rows are started.
+    """
+    if not sources or not targets:
+        return np.zeros((len(sources), len(targets)))
+    active_router, pool = executor.active if executor is not None else (None, None)
+    # After a graph swap the pool serves a different graph than these snaps
+    if pool is not None and active_router is router and _parallel(executor, len(sources)):
+        chunk = max(1, -(-len(sources) // (executor.workers * 4)))
+        try:
+            return _pool_rows(pool, sources, targets, deadline, chunk, executor.workers)
+        except RuntimeError:
+            # Pool shut down by a swap while submitting
+            pass
+    return _rows(router, sources, targets, deadline)
+
+
+def point_matrix(router: Router, sources: List[Tuple[float, float]], targets: List[Tuple[float, float]],
+                 executor: Optional[RouteExecutor] = None, deadline: Optional[float] = None):
+    """Snap ``(lat, lon)`` points and compute their matrix; returns ``(costs, source_snaps, target_snaps)``.
+
+    Snapping thousands of points takes seconds, so it belongs in the same
+    work item as the searches rather than on the event loop.
+    """
+    source_snaps = snap_points(router, sources)
+    target_snaps = snap_points(router, targets)
+    return distance_matrix(router, source_snaps, target_snaps, executor, deadline), source_snaps, target_snaps
@@ -0,0 +1,72 @@
+"""In-process latency histograms, rendered in the Prometheus text format."""
+from typing import Dict, List, Optional, Sequence, Tuple
+import bisect
+import threading
+
+# Seconds; searches on city graphs land in the 1-100 ms range
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SETTLED_BUCKETS = (10, 100, 1000, 10000, 100000, 1000000)
+
+
+class Histogram:
+    """Cumulative-bucket histogram with one series per label value."""
+
+    def __init__(self, name: str, help_text: str, label: Optional[str] = None,
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label = label
+        self.buckets = tuple(buckets)
+        # label value -> (per-bucket counts incl. +Inf, sum, count)
+        self._series: Dict[str, Tuple[List[int], float, int]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, label: str = ''):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total, n = self._series.get(label) or ([0] * (len(self.buckets) + 1), 0.0, 0)
+            counts[i] += 1
+            self._series[label] = (counts, total + value, n + 1)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted(self._series.items())
+        for label, (counts, total, n) in series:
+            base = f'{self.label}="{label}",' if self.label else ''
+            cumulative = 0
+            for bound, c in zip(self.buckets + (float('inf'),), counts):
+                cumulative += c
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{self.name}_bucket{{{base}le="{le}"}} {cumulative}')
+            suffix = f'{{{base[:-1]}}}' if base else ''
+            lines.append(f"{self.name}_sum{suffix} {total}")
+            lines.append(f"{self.name}_count{suffix} {n}")
+        return lines
+
+
+ROUTE_PHASE_SECONDS = Histogram('pathforge_route_phase_seconds',
+                                'Time spent per /route phase (snap, cache, dispatch, search, geometry, serialize).',
+                                label='phase')
+ROUTE_SECONDS = Histogram('pathforge_route_seconds', 'Total /route handling time by response status.', label='status')
+ROUTE_SETTLED = Histogram('pathforge_route_settled_nodes', 'Nodes settled per search by algorithm.',
+                          label='algorithm', buckets=SETTLED_BUCKETS)
+
+HISTOGRAMS = (ROUTE_PHASE_SECONDS, ROUTE_SECONDS, ROUTE_SETTLED)
+
+
+def observe_phases(timings: Dict[str, float]):
+    for phase, seconds in timings.items():
+        ROUTE_PHASE_SECONDS.observe(seconds, phase)
+
+
+def render(gauges: Optional[Dict[str, float]] = None, counters: Optional[Dict[str, float]] = None) -> str:
+    """Text exposition of all histograms plus ``name -> value`` gauges and counters."""
+    lines: List[str] = []
+    for hist in HISTOGRAMS:
+        lines.extend(hist.render())
+    for kind, values in (('gauge', gauges), ('counter', counters)):
+        for name, value in (values or {}).items():
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
@@ -1,62 +1,372 @@
-from typing import Dict, List, Tuple, Optional
+from typing import Callable, Dict, List, Tuple, Optional, Union
 import heapq
-from .heuristics import haversine
+import math
+import os
+import time
+import numpy as np
+from .heuristics import PlanarLowerBound
+from .csr_graph import CSRGraph, Graph
+from .spatial_index import GridIndex, Snap
+from .ch import CHGraph, load_ch
+from .landmarks import Landmarks, load_landmarks
+from .snapshot import SnapshotError, load_graph
+from .dijkstra import SearchLimitExceeded
+from .cache import LRUCache
+
+# astar: straight-line heuristic, alt: landmark heuristic, ch: contraction hierarchy
+ALGORITHMS = ('astar', 'alt', 'ch')
 
-Edge = Dict[str, float]
-Graph = Dict[str, List[Edge]]
 
 class Router:
-    def __init__(self, graph: Graph, node_index: Dict[Tuple[float, float], str]):
-        self.graph = graph
-        self.node_index = node_index
-        # reverse index for coordinates retrieval
-        self.rev_index = {v: k for k, v in node_index.items()}
-
-    def _nearest_node(self, lat: float, lon: float) -> Optional[str]:
-        # Simple linear search; optimize later
-        best = None
-        best_d = float('inf')
-        for nid, (nlat, nlon) in self.rev_index.items():
-            d = haversine(lat, lon, nlat, nlon)
-            if d < best_d:
-                best_d = d
-                best = nid
-        return best
-
-    def route(self, start_lat: float, start_lon: float, end_lat: float, end_lon: float) -> List[Tuple[float, float]]:
-        start_id = self._nearest_node(start_lat, start_lon)
-        end_id = self._nearest_node(end_lat, end_lon)
-        if not start_id or not end_id:
+    def __init__(self, graph: Union[Graph, CSRGraph], node_index: Optional[Dict[Tuple[float, float], str]] = None,
+                 snap_mode: Optional[str] = None, index: Optional[GridIndex] = None,
+                 ch: Optional[CHGraph] = None, landmarks: Optional[Landmarks] = None,
+                 algorithm: Optional[str] = None, snapshot_path: Optional[str] = None,
+                 snapshot_checksum: Optional[str] = None, max_settled: Optional[int] = None):
+        if isinstance(graph, CSRGraph):
+            self.csr = graph
+        else:
+            self.csr = CSRGraph.from_dict(graph, node_index or {})
+        # dict-style adapter for existing callers
+        self.graph = self.csr.as_dict()
+        # Set when the graph is mapped from a snapshot file; worker processes reopen it
+        self.snapshot_path = snapshot_path
+        self.snapshot_checksum = snapshot_checksum
+        # About 3-5 s of pure-Python search, inside the default ROUTE_TIMEOUT_S; 0 means unlimited
+        self.max_settled = int(os.getenv('ROUTE_MAX_SETTLED', '1000000')) if max_settled is None else max_settled
+        self.index = index or GridIndex(self.csr.coords, float(os.getenv('SNAP_CELL_DEG', '0.01')))
+        self.snap_mode = snap_mode or os.getenv('ROUTER_SNAP', 'node')
+        # astar heuristic; reads node coordinates straight from the (mapped) coords array
+        self.lower_bound = PlanarLowerBound(self.csr.coords)
+        if ch is not None and ch.num_nodes != self.csr.num_nodes:
+            print("[Router] CH does not match the graph, ignoring it")
+            ch = None
+        self.ch = ch
+        if landmarks is not None and len(landmarks.dist_from) != self.csr.num_nodes:
+            print("[Router] Landmarks do not match the graph, ignoring them")
+            landmarks = None
+        self.landmarks = landmarks
+        self.overrides: Dict[int, float] = {}
+        self.default_algorithm = algorithm or os.getenv('ROUTER_ALGORITHM') or ('ch' if ch is not None else 'astar')
+        if self.default_algorithm not in self.algorithms():
+            print(f"[Router] Algorithm '{self.default_algorithm}' not available, using astar")
+            self.default_algorithm = 'astar'
+        # Costs as built; overrides swap in a graph view with a patched copy
+        self.base_costs = self.csr.costs
+        # Caches belong to this graph; a rebuilt graph gets a new Router and empty caches
+        self.route_cache = LRUCache(int(float(os.getenv('ROUTE_CACHE_MB', '64')) * 2**20),
+                                    float(os.getenv('ROUTE_CACHE_TTL_S', '0')), _path_bytes)
+        self.snap_cache = LRUCache(int(float(os.getenv('SNAP_CACHE_MB', '4')) * 2**20), sizeof=lambda snap: 200)
+        self.snap_decimals = int(os.getenv('SNAP_CACHE_DECIMALS', '5'))
+        # Bumped whenever cached routes become invalid; searches started before skip their store
+        self.cache_generation = 0
+
+    @classmethod
+    def from_snapshot(cls, path: str, ch_path: Optional[str] = None, checksum: Optional[str] = None,
+                      lm_path: Optional[str] = None, **kwargs) -> 'Router':
+        """Router over a memory-mapped snapshot, with its landmarks and CH if available.
+
+        Raises ``SnapshotError`` if ``checksum`` is given and the file holds another graph.
+        """
+        csr, index, _, header = load_graph(path)
+        if checksum is not None and header['checksum'] != checksum:
+            raise SnapshotError(f"{path} has checksum {header['checksum']}, expected {checksum}")
+        ch_path = ch_path or os.getenv('GRAPH_CH_PATH', 'backend/data/graph.ch.pfg')
+        lm_path = lm_path or os.getenv('GRAPH_LANDMARKS_PATH', 'backend/data/graph.lm.pfg')
+        return cls(csr, index=index, ch=load_ch(ch_path, header['checksum']),
+                   landmarks=load_landmarks(lm_path, header['checksum']), snapshot_path=str(path),
+                   snapshot_checksum=header['checksum'], **kwargs)
+
+    @property
+    def algorithm(self) -> str:
+        # Falls back while the default is unavailable, e.g. CH under cost overrides
+        available = self.algorithms()
+        if self.default_algorithm in available:
+            return self.default_algorithm
+        return 'alt' if 'alt' in available else 'astar'
+
+    def algorithms(self) -> List[str]:
+        # CH shortcuts bake in the original costs
+        available = {'astar': True, 'alt': self.landmarks is not None, 'ch': self.ch is not None and not self.overrides}
+        return [a for a in ALGORITHMS if available[a]]
+
+    def _nearest_node(self, lat: float, lon: float) -> Optional[int]:
+        found = self.index.nearest(lat, lon)
+        return found[0] if found else None
+
+    def snap(self, lat: float, lon: float) -> Optional[Snap]:
+        # Inputs are rounded to SNAP_CACHE_DECIMALS (5 ~ 1 m) so nearby repeats share one entry
+        lat, lon = round(lat, self.snap_decimals), round(lon, self.snap_decimals)
+        key = (lat, lon)
+        snap = self.snap_cache.get(key, _MISSING)
+        if snap is _MISSING:
+            if self.snap_mode == 'edge':
+                snap = self.index.snap_edge(lat, lon, self.csr)
+            else:
+                snap = self.index.snap_node(lat, lon)
+            self.snap_cache.put(key, snap)
+        return snap
+
+    def check_algorithm(self, algorithm: Optional[str]) -> str:
+        algorithm = algorithm or self.algorithm
+        if algorithm not in self.algorithms():
+            raise ValueError(f"Unknown or unavailable algorithm '{algorithm}'")
+        return algorithm
+
+    def cache_stats(self) -> Dict[str, Dict[str, int]]:
+        return {"route": self.route_cache.stats(), "snap": self.snap_cache.stats()}
+
+    def clear_cache(self):
+        self.cache_generation += 1
+        self.route_cache.clear()
+        self.snap_cache.clear()
+
+    def apply_overrides(self, changes: Dict[int, Optional[float]]) -> int:
+        """Scale the cost of every edge of a road in place; returns the number of edges changed.
+
+        ``changes`` maps road id to a factor ``>= 1`` (``inf`` closes the road)
+        or ``None`` to restore the built cost. Factors below 1 are rejected
+        because they would break the A*/ALT lower bounds. While overrides are
+        active CH is unavailable.
+        """
+        if self.csr.edge_road is None:
+            raise ValueError("Graph has no road ids; rebuild the snapshot to use overrides")
+        for factor in changes.values():
+            if factor is not None and not factor >= 1.0:
+                raise ValueError(f"Cost factor must be >= 1, got {factor}")
+        road_edges = {road: np.flatnonzero(self.csr.edge_road == road) for road in changes}
+        # A typo would otherwise disable CH with nothing changed
+        unknown = sorted(road for road, factor in changes.items() if factor is not None and not len(road_edges[road]))
+        if unknown:
+            raise ValueError(f"No edges for road ids {unknown}")
+        costs = np.array(self.csr.costs)
+        changed = 0
+        for road, factor in changes.items():
+            edges = road_edges[road]
+            if factor is None:
+                self.overrides.pop(road, None)
+                costs[edges] = self.base_costs[edges]
+            else:
+                self.overrides[road] = factor
+                costs[edges] = np.inf if math.isinf(factor) else self.base_costs[edges] * factor
+            changed += len(edges)
+        # Searches take self.csr once, so a running search keeps the costs it started with
+        self.csr = self.csr.with_costs(costs)
+        self.graph = self.csr.as_dict()
+        self.cache_generation += 1
+        self.route_cache.clear()
+        return changed
+
+    def route(self, start_lat: float, start_lon: float, end_lat: float, end_lon: float,
+              algorithm: Optional[str] = None, timings: Optional[Dict[str, float]] = None) -> List[Tuple[float, float]]:
+        """Path between two points as ``(lat, lon)`` pairs.
+
+        ``timings`` receives seconds per phase (snap, cache, search, geometry) when given.
+        """
+        algorithm = self.check_algorithm(algorithm)
+        t0 = time.perf_counter()
+        start = self.snap(start_lat, start_lon)
+        end = self.snap(end_lat, end_lon)
+        if timings is not None:
+            timings['snap'] = time.perf_counter() - t0
+        if start is None or end is None:
             return []
+        t0 = time.perf_counter()
+        path = self.cached_route(start, end, algorithm)
+        if timings is not None:
+            timings['cache'] = time.perf_counter() - t0
+        if path is None:
+            generation = self.cache_generation
+            path = self.route_snaps(start, end, algorithm, timings)
+            self.store_route(start, end, algorithm, path, generation)
+        return path
+
+    def cached_route(self, start: Snap, end: Snap, algorithm: str) -> Optional[List[Tuple[float, float]]]:
+        path = self.route_cache.get((start.key, end.key, algorithm))
+        if not path:
+            return path
+        # Edge snaps sharing a key may differ in the last digits of the projected point
+        path = list(path)
+        if start.edge >= 0:
+            path[0] = (start.lat, start.lon)
+        if end.edge >= 0:
+            path[-1] = (end.lat, end.lon)
+        return path
+
+    def store_route(self, start: Snap, end: Snap, algorithm: str, path: List[Tuple[float, float]],
+                    generation: Optional[int] = None):
+        """Cache ``path`` unless the cache was invalidated since ``generation`` was read."""
+        if generation is not None and generation != self.cache_generation:
+            return
+        self.route_cache.put((start.key, end.key, algorithm), path)
 
+    def route_snaps(self, start: Snap, end: Snap, algorithm: str, timings: Optional[Dict[str, float]] = None,
+                    stats: Optional[Dict[str, int]] = None) -> List[Tuple[float, float]]:
+        """Uncached search and geometry between two snaps."""
+        t0 = time.perf_counter()
+        found = self._search(start, end, algorithm, stats)
+        t1 = time.perf_counter()
+        path = [] if found is None else self._geometry(start, end, *found)
+        if timings is not None:
+            timings['search'] = t1 - t0
+            timings['geometry'] = time.perf_counter() - t1
+        return path
+
+    def _geometry(self, start: Snap, end: Snap, nodes: List[int], edges: List[int]) -> List[Tuple[float, float]]:
+        csr = self.csr
+        if not nodes:
+            # Both points on the same edge
+            poly = csr.edge_geometry(start.edge)
+            return _dedupe([(start.lat, start.lon)] + poly[start.seg + 1:end.seg + 1] + [(end.lat, end.lon)])
+        path = [csr.coord(nodes[0])]
+        # Edge snaps start/end on the projected point, not the vertex
+        if start.edge >= 0:
+            poly = csr.edge_geometry(start.edge)
+            if nodes[0] == start.other:
+                head = poly[start.seg + 1:]
+            else:
+                head = poly[:start.seg + 1][::-1]
+            path = [(start.lat, start.lon)] + head
+        for e in edges:
+            path.extend(csr.edge_geometry(e)[1:])
+        if end.edge >= 0:
+            poly = csr.edge_geometry(end.edge)
+            if nodes[-1] == end.node:
+                tail = poly[:end.seg + 1]
+            else:
+                tail = poly[end.seg + 1:][::-1]
+            path.extend(tail + [(end.lat, end.lon)])
+        return _dedupe(path)
+
+    def _edge_cost(self, csr: CSRGraph, a: int, b: int) -> Optional[float]:
+        targets, costs = csr.neighbors(a)
+        found = [c for t, c in zip(targets, costs) if t == b]
+        return min(found) if found else None
+
+    def _sources(self, snap: Snap, csr: Optional[CSRGraph] = None) -> Dict[int, float]:
+        # Initial costs from the snapped point to the graph nodes
+        csr = self.csr if csr is None else csr
+        if snap.edge < 0:
+            return {snap.node: 0.0}
+        out = {snap.other: (1.0 - snap.t) * float(csr.costs[snap.edge])}
+        back = self._edge_cost(csr, snap.other, snap.node)
+        if back is not None:
+            out[snap.node] = min(out.get(snap.node, float('inf')), snap.t * back)
+        return out
+
+    def _targets(self, snap: Snap, csr: Optional[CSRGraph] = None) -> Dict[int, float]:
+        # Remaining costs from graph nodes to the snapped point
+        csr = self.csr if csr is None else csr
+        if snap.edge < 0:
+            return {snap.node: 0.0}
+        out = {snap.node: snap.t * float(csr.costs[snap.edge])}
+        back = self._edge_cost(csr, snap.other, snap.node)
+        if back is not None:
+            out[snap.other] = min(out.get(snap.other, float('inf')), (1.0 - snap.t) * back)
+        return out
+
+    def _search(self, start: Snap, end: Snap, algorithm: str = 'astar',
+                stats: Optional[Dict[str, int]] = None) -> Optional[Tuple[List[int], List[int]]]:
+        """Search between two snaps; returns the node path and the CSR edges between them.
+
+        ``stats['settled']`` receives the number of settled nodes when given.
+        """
+        # One graph for the whole search, even if overrides swap self.csr meanwhile
+        csr = self.csr
+        if start.edge >= 0 and start.edge == end.edge and end.t >= start.t:
+            # Both points on the same edge, in travel direction
+            return ([], []) if math.isfinite(csr.costs[start.edge]) else None
+        if algorithm == 'ch':
+            return self._search_ch(csr, start, end, stats)
+        if algorithm == 'alt':
+            return self._search_astar(csr, start, end, self._alt_heuristic(csr, start, end), stats)
+        return self._search_astar(csr, start, end, None, stats)
+
+    def _alt_heuristic(self, csr: CSRGraph, start: Snap, end: Snap) -> Callable[[int], float]:
+        h = self.landmarks.heuristic(self._targets(end, csr))
+        h.select(start.node if start.edge < 0 else start.other)
+        return h
+
+    def _search_ch(self, csr: CSRGraph, start: Snap, end: Snap,
+                   stats: Optional[Dict[str, int]] = None) -> Optional[Tuple[List[int], List[int]]]:
+        found = self.ch.query(self._sources(start, csr), self._targets(end, csr), stats, self.max_settled)
+        if found is None:
+            return None
+        _, nodes = found
+        edges = [self._edge_between(csr, a, b) for a, b in zip(nodes, nodes[1:])]
+        return nodes, edges
+
+    def _edge_between(self, csr: CSRGraph, a: int, b: int) -> int:
+        # Cheapest CSR edge a -> b
+        lo = int(csr.offsets[a])
+        targets, costs = csr.neighbors(a)
+        best = min((c, i) for i, (t, c) in enumerate(zip(targets, costs)) if t == b)
+        return lo + best[1]
+
+    def _search_astar(self, csr: CSRGraph, start: Snap, end: Snap, heuristic: Optional[Callable[[int], float]] = None,
+                      stats: Optional[Dict[str, int]] = None) -> Optional[Tuple[List[int], List[int]]]:
+        if heuristic is None:
+            heuristic = self.lower_bound.to(end.lat, end.lon)
+        targets = self._targets(end, csr)
         open_set = []
-        heapq.heappush(open_set, (0, start_id))
-        came_from: Dict[str, str] = {}
-        g: Dict[str, float] = {start_id: 0.0}
-        f: Dict[str, float] = {start_id: haversine(*self.rev_index[start_id], end_lat, end_lon)}
+        came_from: Dict[int, Tuple[int, int]] = {}
+        g: Dict[int, float] = {}
+        for node, cost in self._sources(start, csr).items():
+            g[node] = cost
+            heapq.heappush(open_set, (cost + heuristic(node), node))
         closed = set()
+        best = float('inf')
+        best_node = None
 
         while open_set:
-            _, current = heapq.heappop(open_set)
-            if current == end_id:
-                return self._reconstruct(came_from, current)
+            f, current = heapq.heappop(open_set)
+            if f >= best:
+                break
+            if current in closed:
+                continue
             closed.add(current)
-            for edge in self.graph.get(current, []):
-                neighbor = edge['to']
-                tentative_g = g[current] + edge['cost']
-                if neighbor in closed and tentative_g >= g.get(neighbor, float('inf')):
-                    continue
+            if self.max_settled and len(closed) > self.max_settled:
+                raise SearchLimitExceeded(f"settled more than {self.max_settled} nodes")
+            if current in targets and g[current] + targets[current] < best:
+                best = g[current] + targets[current]
+                best_node = current
+            lo = int(csr.offsets[current])
+            nbrs, costs = csr.neighbors(current)
+            for i, (neighbor, cost) in enumerate(zip(nbrs, costs)):
+                tentative_g = g[current] + cost
                 if tentative_g < g.get(neighbor, float('inf')):
-                    came_from[neighbor] = current
+                    came_from[neighbor] = (current, lo + i)
                     g[neighbor] = tentative_g
-                    f[neighbor] = tentative_g + haversine(*self.rev_index[neighbor], end_lat, end_lon)
-                    heapq.heappush(open_set, (f[neighbor], neighbor))
-        return []
+                    heapq.heappush(open_set, (tentative_g + heuristic(neighbor), neighbor))
+        if stats is not None:
+            stats['settled'] = len(closed)
+        if best_node is None:
+            return None
+        return self._reconstruct(came_from, best_node)
 
-    def _reconstruct(self, came_from: Dict[str, str], current: str) -> List[Tuple[float, float]]:
-        path = [self.rev_index[current]]
+    def _reconstruct(self, came_from: Dict[int, Tuple[int, int]], current: int) -> Tuple[List[int], List[int]]:
+        nodes = [current]
+        edges: List[int] = []
         while current in came_from:
-            current = came_from[current]
-            path.append(self.rev_index[current])
-        path.reverse()
-        return path
+            current, edge = came_from[current]
+            nodes.append(current)
+            edges.append(edge)
+        nodes.reverse()
+        edges.reverse()
+        return nodes, edges
+
+
+_MISSING = object()
+
+
+def _path_bytes(path: List[Tuple[float, float]]) -> int:
+    # list slot + tuple + two floats per point
+    return 56 + 120 * len(path)
+
+
+def _dedupe(path: List[Tuple[float, float]]) -> List[Tuple[float, float]]:
+    out = path[:1]
+    for p in path[1:]:
+        if p != out[-1]:
+            out.append(p)
+    return out
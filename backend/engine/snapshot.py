@@ -0,0 +1,220 @@
+"""Binary graph snapshot: a JSON header followed by flat, aligned arrays.
+
+Layout::
+
+    MAGIC (8 bytes) | header length (uint64 LE) | header JSON | padding | arrays...
+
+Arrays are 64-byte aligned and opened with ``mmap`` so worker processes share
+one copy through the page cache.
+
+Versioned snapshots live next to a small pointer file at the stable path::
+
+    LINK_MAGIC (8 bytes) | file name (UTF-8)
+
+Pointers are replaced with ``os.replace`` and never mapped, so publishing a
+new version works while old ones are open, on Windows too.
+"""
+from typing import Dict, Tuple, Any, Optional
+import json
+import mmap
+import os
+import re
+import struct
+import time
+import zlib
+from pathlib import Path
+import numpy as np
+from .csr_graph import CSRGraph
+from .spatial_index import GridIndex
+
+MAGIC = b'PFGRAPH\x00'
+LINK_MAGIC = b'PFGLINK\x00'
+VERSION = 1
+ALIGN = 64
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _align(n: int) -> int:
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+def _bytes(arr: np.ndarray) -> memoryview:
+    return memoryview(arr.reshape(-1).view(np.uint8))
+
+
+def _version(header: Dict[str, Any]) -> str:
+    # Arrays plus what callers compare (fingerprint, meta); equal versions are interchangeable
+    key = json.dumps([header['checksum'], header['fingerprint'], header['meta']], sort_keys=True)
+    return f"{zlib.crc32(key.encode('utf-8')):08x}"
+
+
+def versioned_path(path: Path, version: str) -> Path:
+    """``graph.pfg`` -> ``graph.<version>.pfg``."""
+    path = Path(path)
+    return path.with_name(f"{path.stem}.{version}{path.suffix}")
+
+
+def resolve_snapshot(path: Path) -> Path:
+    """File holding the snapshot published at ``path``: the pointer target, or ``path`` itself."""
+    path = Path(path)
+    with path.open('rb') as f:
+        head = f.read(len(LINK_MAGIC) + 1024)
+    if head.startswith(LINK_MAGIC):
+        return path.parent / head[len(LINK_MAGIC):].decode('utf-8')
+    return path.resolve()
+
+
+def _publish(path: Path, target: Path, keep: int):
+    # Repoint the stable name at the new version, then drop old versions
+    tmp = path.with_name(path.name + '.lnk')
+    tmp.write_bytes(LINK_MAGIC + target.name.encode('utf-8'))
+    os.replace(tmp, path)
+    pattern = re.compile(re.escape(path.stem) + r'\.[0-9a-f]{8}' + re.escape(path.suffix) + '$')
+    versions = [p for p in path.parent.iterdir() if pattern.match(p.name) and p != target]
+    versions.sort(key=lambda p: p.stat().st_mtime, reverse=True)
+    for old in versions[max(keep - 1, 0):]:
+        try:
+            old.unlink()
+        except OSError as e:
+            # Still mapped by a process on Windows; a later save retries
+            print(f"[Snapshot] Keeping {old.name}: {e}")
+
+
+def write_snapshot(path: Path, arrays: Dict[str, np.ndarray], fingerprint: Optional[str] = None,
+                   meta: Optional[Dict[str, Any]] = None, versioned: bool = False) -> Dict[str, Any]:
+    """Write ``arrays`` atomically; returns the header that was written.
+
+    ``versioned`` writes ``versioned_path(path, version)`` and points ``path``
+    at it with a pointer file, keeping the last ``GRAPH_SNAPSHOT_KEEP``
+    versions. A versioned file is never rewritten, so a reader holding its
+    name never sees another graph behind it.
+    """
+    table = {}
+    offset = 0
+    checksum = 0
+    for name, arr in arrays.items():
+        arr = np.ascontiguousarray(arr)
+        arrays[name] = arr
+        table[name] = {'dtype': arr.dtype.str, 'shape': list(arr.shape), 'offset': offset, 'nbytes': arr.nbytes}
+        checksum = zlib.crc32(_bytes(arr), checksum)
+        offset = _align(offset + arr.nbytes)
+    header = {
+        'version': VERSION,
+        'created': int(time.time()),
+        'fingerprint': fingerprint,
+        'checksum': f"{checksum:08x}",
+        'meta': meta or {},
+        'arrays': table,
+    }
+    raw = json.dumps(header).encode('utf-8')
+    data_start = _align(len(MAGIC) + 8 + len(raw))
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    target = versioned_path(path, _version(header)) if versioned else path
+    if versioned and target.exists():
+        # Same arrays, fingerprint and meta are already on disk (and may be mapped)
+        _publish(path, target, int(os.getenv('GRAPH_SNAPSHOT_KEEP', '3')))
+        return read_header(target)
+    tmp = target.with_name(target.name + '.tmp')
+    with tmp.open('wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(raw)))
+        f.write(raw)
+        for name, arr in arrays.items():
+            f.seek(data_start + table[name]['offset'])
+            f.write(_bytes(arr))
+        f.truncate(data_start + offset)
+    # Readers that still map the old file keep its inode
+    os.replace(tmp, target)
+    if versioned:
+        _publish(path, target, int(os.getenv('GRAPH_SNAPSHOT_KEEP', '3')))
+    return header
+
+
+def _parse_header(buf) -> Tuple[Dict[str, Any], int]:
+    if bytes(buf[:len(MAGIC)]) != MAGIC:
+        raise SnapshotError("not a graph snapshot")
+    (length,) = struct.unpack_from('<Q', buf, len(MAGIC))
+    start = len(MAGIC) + 8
+    header = json.loads(bytes(buf[start:start + length]).decode('utf-8'))
+    if header.get('version') != VERSION:
+        raise SnapshotError(f"unsupported snapshot version {header.get('version')}")
+    return header, _align(start + length)
+
+
+def read_header(path: Path) -> Dict[str, Any]:
+    with resolve_snapshot(path).open('rb') as f:
+        head = f.read(len(MAGIC) + 8)
+        if len(head) < len(MAGIC) + 8:
+            raise SnapshotError("truncated snapshot")
+        (length,) = struct.unpack_from('<Q', head, len(MAGIC))
+        header, _ = _parse_header(head + f.read(length))
+    return header
+
+
+def open_snapshot(path: Path, verify: bool = False) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+    """Map a snapshot read-only and return zero-copy array views plus the header."""
+    with resolve_snapshot(path).open('rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    header, data_start = _parse_header(mm)
+    arrays = {}
+    checksum = 0
+    for name, info in header['arrays'].items():
+        start = data_start + info['offset']
+        if start + info['nbytes'] > len(mm):
+            raise SnapshotError(f"truncated array {name}")
+        count = int(np.prod(info['shape'])) if info['shape'] else 1
+        if count == 0:
+            arrays[name] = np.zeros(info['shape'], dtype=np.dtype(info['dtype']))
+            continue
+        arr = np.frombuffer(mm, dtype=np.dtype(info['dtype']), count=count, offset=start).reshape(info['shape'])
+        if verify:
+            checksum = zlib.crc32(memoryview(mm)[start:start + info['nbytes']], checksum)
+        arrays[name] = arr
+    if verify and f"{checksum:08x}" != header['checksum']:
+        raise SnapshotError("checksum mismatch")
+    return arrays, header
+
+
+def open_matching(path: Path, fingerprint: Optional[str] = None, tag: str = 'Snapshot') -> Optional[Dict[str, np.ndarray]]:
+    """Arrays of a derived file (CH, landmarks); None if missing, unreadable or built for another graph."""
+    path = Path(path)
+    if not path.exists():
+        return None
+    try:
+        arrays, header = open_snapshot(path)
+    except (OSError, ValueError, SnapshotError) as e:
+        print(f"[{tag}] Failed to load {path}: {e}")
+        return None
+    if fingerprint and header.get('fingerprint') != fingerprint:
+        print(f"[{tag}] {path} was built for another graph, ignoring")
+        return None
+    return arrays
+
+
+def save_graph(path: Path, csr: CSRGraph, index: Optional[GridIndex] = None, fingerprint: Optional[str] = None,
+               extra: Optional[Dict[str, np.ndarray]] = None, meta: Optional[Dict[str, Any]] = None,
+               versioned: bool = False) -> Dict[str, Any]:
+    """Write a CSR graph, its spatial index and any ``extra`` arrays and ``meta`` fields."""
+    arrays = csr.to_arrays()
+    meta = dict(meta or {}, nodes=csr.num_nodes, edges=csr.num_edges)
+    if index is not None:
+        arrays.update(index.to_arrays())
+        meta['cell_deg'] = index.cell
+    if extra:
+        arrays.update(extra)
+    return write_snapshot(path, arrays, fingerprint, meta, versioned)
+
+
+def load_graph(path: Path, verify: bool = False) -> Tuple[CSRGraph, Optional[GridIndex], Dict[str, np.ndarray], Dict[str, Any]]:
+    """Open a graph snapshot; returns ``(csr, index, arrays, header)``."""
+    arrays, header = open_snapshot(path, verify=verify)
+    csr = CSRGraph.from_arrays(arrays)
+    index = None
+    if 'index_nodes' in arrays:
+        index = GridIndex(csr.coords, header['meta']['cell_deg'], arrays)
+    return csr, index, arrays, header
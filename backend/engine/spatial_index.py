@@ -0,0 +1,279 @@
+from typing import Dict, List, Tuple, NamedTuple, Optional
+import math
+import numpy as np
+from .heuristics import METERS_PER_DEG, equirectangular_np, haversine, haversine_np
+from .csr_graph import CSRGraph
+
+
+class Snap(NamedTuple):
+    """A query point snapped onto the graph.
+
+    Node snaps have ``edge == -1``. Edge snaps lie on CSR edge ``edge``
+    (``node`` -> ``other``) at fraction ``t`` of its cost from ``node``, on
+    polyline segment ``seg``.
+    """
+    node: int
+    other: int
+    edge: int
+    t: float
+    lat: float
+    lon: float
+    dist: float
+    seg: int = 0
+
+    @property
+    def key(self) -> Tuple:
+        if self.edge < 0:
+            return (self.node,)
+        return (self.edge, round(self.t, 4))
+
+
+class GridIndex:
+    """Bucket index over a regular lat/lon grid, built once per graph.
+
+    Nodes are sorted by cell key so every grid row of a query window is one
+    contiguous ``searchsorted`` range. For edge snapping, edges are indexed
+    the same way under every cell their segments' bounding boxes touch
+    (``index_edges``).
+    """
+
+    def __init__(self, coords: np.ndarray, cell_deg: float = 0.01, arrays: Optional[Dict[str, np.ndarray]] = None):
+        self.coords = coords
+        self.cell = cell_deg
+        self.ncols = int(math.ceil(360.0 / cell_deg)) + 1
+        self.edge_keys: Optional[np.ndarray] = None
+        self.edge_ids: Optional[np.ndarray] = None
+        self.edge_bounds: Optional[Tuple[int, int, int, int]] = None
+        if arrays is not None:
+            # Prebuilt from a snapshot
+            self.nodes = arrays['index_nodes']
+            self.keys = arrays['index_keys']
+            self.bounds = _bounds(arrays['index_bounds'])
+            if 'index_edge_keys' in arrays:
+                self.edge_keys = arrays['index_edge_keys']
+                self.edge_ids = arrays['index_edge_ids']
+                self.edge_bounds = _bounds(arrays['index_edge_bounds'])
+            return
+        valid = np.flatnonzero(~np.isnan(coords[:, 0])) if len(coords) else np.zeros(0, dtype=np.int64)
+        rows, cols = self._cells(coords[valid, 0], coords[valid, 1])
+        keys = rows * self.ncols + cols
+        order = np.argsort(keys, kind='stable')
+        self.nodes = valid[order]
+        self.keys = keys[order]
+        if len(valid):
+            self.bounds = (int(rows.min()), int(rows.max()), int(cols.min()), int(cols.max()))
+        else:
+            self.bounds = None
+
+    def index_edges(self, csr: CSRGraph):
+        """Index every edge under the cells its segments cross, one direction per road.
+
+        The builder stores both directions of each road with the same
+        geometry, so only edges whose geometry runs forward are kept; snaps
+        reach the reverse direction through the router's back-edge lookup.
+        """
+        edges = np.arange(csr.num_edges, dtype=np.int64)
+        if csr.geom_coords is not None:
+            edges = edges[csr.geom_first <= csr.geom_last]
+        sources = np.searchsorted(csr.offsets, edges, side='right') - 1
+        a, b, edge_of_seg, _ = _edge_segments(csr, edges, sources)
+        r0, c0 = self._cells(np.minimum(a[:, 0], b[:, 0]), np.minimum(a[:, 1], b[:, 1]))
+        r1, c1 = self._cells(np.maximum(a[:, 0], b[:, 0]), np.maximum(a[:, 1], b[:, 1]))
+        nr, nc = r1 - r0 + 1, c1 - c0 + 1
+        count = nr * nc
+        seg = np.repeat(np.arange(len(a)), count)
+        within = np.arange(int(count.sum())) - np.repeat(np.cumsum(count) - count, count)
+        rows = r0[seg] + within // nc[seg]
+        cols = c0[seg] + within % nc[seg]
+        # One entry per (cell, edge), sorted by cell
+        span = max(csr.num_edges, 1)
+        pairs = np.unique((rows * self.ncols + cols) * span + edges[edge_of_seg[seg]])
+        self.edge_keys = pairs // span
+        self.edge_ids = pairs % span
+        self.edge_bounds = (int(rows.min()), int(rows.max()), int(cols.min()), int(cols.max())) if len(rows) else None
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        arrays = {'index_nodes': self.nodes, 'index_keys': self.keys, 'index_bounds': _bounds_array(self.bounds)}
+        if self.edge_keys is not None:
+            arrays.update({'index_edge_keys': self.edge_keys, 'index_edge_ids': self.edge_ids,
+                           'index_edge_bounds': _bounds_array(self.edge_bounds)})
+        return arrays
+
+    def _cells(self, lat, lon):
+        rows = np.floor((np.asarray(lat) + 90.0) / self.cell).astype(np.int64)
+        cols = np.floor((np.asarray(lon) + 180.0) / self.cell).astype(np.int64)
+        return rows, cols
+
+    def _window(self, row: int, col: int, r: int, edges: bool = False) -> np.ndarray:
+        # Nodes (or indexed edges) in the (2r+1)x(2r+1) cell square around (row, col)
+        keys, values, bounds = (self.edge_keys, self.edge_ids, self.edge_bounds) if edges else \
+            (self.keys, self.nodes, self.bounds)
+        lo_c = max(col - r, 0)
+        hi_c = min(col + r, self.ncols - 1)
+        parts = []
+        for rr in range(max(row - r, bounds[0]), min(row + r, bounds[1]) + 1):
+            base = rr * self.ncols
+            lo = np.searchsorted(keys, base + lo_c, side='left')
+            hi = np.searchsorted(keys, base + hi_c, side='right')
+            if hi > lo:
+                parts.append(values[lo:hi])
+        if not parts:
+            return np.zeros(0, dtype=np.int64)
+        return np.concatenate(parts)
+
+    def _covered(self, row: int, col: int, r: int, edges: bool = False) -> bool:
+        r0, r1, c0, c1 = self.edge_bounds if edges else self.bounds
+        return row - r <= r0 and row + r >= r1 and col - r <= c0 and col + r >= c1
+
+    def _clearance(self, lat: float, lon: float, row: int, col: int, r: int) -> float:
+        # Lower bound (meters) to any point outside the scanned window
+        lat_lo = (row - r) * self.cell - 90.0
+        lat_hi = (row + r + 1) * self.cell - 90.0
+        lon_lo = (col - r) * self.cell - 180.0
+        lon_hi = (col + r + 1) * self.cell - 180.0
+        dlat = min(lat - lat_lo, lat_hi - lat)
+        max_abs_lat = min(max(abs(lat_lo), abs(lat_hi)), 90.0)
+        dlon = min(lon - lon_lo, lon_hi - lon) * math.cos(math.radians(max_abs_lat))
+        return max(min(dlat, dlon), 0.0) * METERS_PER_DEG
+
+    def _distances(self, lat: float, lon: float, nodes: np.ndarray) -> np.ndarray:
+        pts = self.coords[nodes]
+        return haversine_np(lat, lon, pts[:, 0], pts[:, 1])
+
+    def knn(self, lat: float, lon: float, k: int = 1) -> List[Tuple[int, float]]:
+        """Return up to ``k`` ``(node, meters)`` pairs ordered by distance."""
+        if self.bounds is None or k <= 0:
+            return []
+        row, col = (int(v) for v in self._cells(lat, lon))
+        r = 0
+        while True:
+            nodes = self._window(row, col, r)
+            if len(nodes) >= k or self._covered(row, col, r):
+                dists = self._distances(lat, lon, nodes)
+                order = np.argsort(dists, kind='stable')[:k]
+                best = list(zip(nodes[order].tolist(), dists[order].tolist()))
+                done = self._covered(row, col, r)
+                if done or (len(best) == k and best[-1][1] <= self._clearance(lat, lon, row, col, r)):
+                    return best
+            r = max(1, r * 2)
+
+    def nearest(self, lat: float, lon: float) -> Optional[Tuple[int, float]]:
+        found = self.knn(lat, lon, 1)
+        return found[0] if found else None
+
+    def radius(self, lat: float, lon: float, meters: float) -> List[Tuple[int, float]]:
+        """Return ``(node, meters)`` pairs within ``meters`` ordered by distance."""
+        if self.bounds is None:
+            return []
+        row, col = (int(v) for v in self._cells(lat, lon))
+        cos_lat = max(math.cos(math.radians(min(abs(lat) + meters / METERS_PER_DEG, 89.9))), 1e-6)
+        r = int(math.ceil(meters / (METERS_PER_DEG * self.cell * cos_lat)))
+        nodes = self._window(row, col, r)
+        dists = self._distances(lat, lon, nodes)
+        inside = np.flatnonzero(dists <= meters)
+        order = inside[np.argsort(dists[inside], kind='stable')]
+        return list(zip(nodes[order].tolist(), dists[order].tolist()))
+
+    def snap_node(self, lat: float, lon: float) -> Optional[Snap]:
+        found = self.nearest(lat, lon)
+        if found is None:
+            return None
+        node, dist = found
+        nlat, nlon = self.coords[node].tolist()
+        return Snap(node, -1, -1, 0.0, nlat, nlon, dist)
+
+    def snap_edge(self, lat: float, lon: float, csr: CSRGraph) -> Optional[Snap]:
+        """Project onto the closest edge polyline.
+
+        Candidate edges come from the edge grid; the window widens until no
+        edge outside it can be closer than the best projection. All segments
+        of all candidates are projected in one batch.
+        """
+        if self.edge_keys is None:
+            # Snapshots from before the edge grid; built once per process
+            self.index_edges(csr)
+        if self.edge_bounds is None:
+            return None
+        row, col = (int(v) for v in self._cells(lat, lon))
+        r = 0
+        while True:
+            covered = self._covered(row, col, r, edges=True)
+            edges = np.unique(self._window(row, col, r, edges=True))
+            if len(edges):
+                found = _project(lat, lon, csr, edges)
+                if covered or found[0] <= self._clearance(lat, lon, row, col, r):
+                    return _snap(lat, lon, csr, edges, found)
+            elif covered:
+                return None
+            r = max(1, r * 2)
+
+
+def _bounds(arr: np.ndarray) -> Optional[Tuple[int, int, int, int]]:
+    return tuple(int(v) for v in arr) if len(arr) else None
+
+
+def _bounds_array(bounds: Optional[Tuple[int, int, int, int]]) -> np.ndarray:
+    return np.asarray(bounds if bounds else [], dtype=np.int64)
+
+
+def _project(lat: float, lon: float, csr: CSRGraph, edges: np.ndarray):
+    """Closest point on every segment of ``edges``; returns the best (distance, segment) and the batch."""
+    sources = np.searchsorted(csr.offsets, edges, side='right') - 1
+    a, b, edge_of_seg, seg_index = _edge_segments(csr, edges, sources)
+    alat, alon, blat, blon = a[:, 0], a[:, 1], b[:, 0], b[:, 1]
+    # Closest point on each segment, in a local equirectangular plane
+    cos_lat = math.cos(math.radians(lat))
+    ax, ay = (alon - lon) * cos_lat, alat - lat
+    dx, dy = (blon - alon) * cos_lat, blat - alat
+    len2 = dx * dx + dy * dy
+    with np.errstate(invalid='ignore', divide='ignore'):
+        u = np.where(len2 > 0, np.clip(-(ax * dx + ay * dy) / len2, 0.0, 1.0), 0.0)
+    plat = alat + (blat - alat) * u
+    plon = alon + (blon - alon) * u
+    # Candidates are ranked with the cheaper equirectangular distance;
+    # only the winner gets an exact haversine distance
+    dist = equirectangular_np(lat, lon, plat, plon)
+    i = int(np.argmin(dist))
+    return float(dist[i]), i, (a, b, edge_of_seg, seg_index, sources, u, plat, plon)
+
+
+def _snap(lat: float, lon: float, csr: CSRGraph, edges: np.ndarray, found) -> Snap:
+    _, i, (a, b, edge_of_seg, seg_index, sources, u, plat, plon) = found
+    e = int(edges[edge_of_seg[i]])
+    # Fraction along the edge by length; its segments are contiguous and in order
+    mine = np.flatnonzero(edge_of_seg == edge_of_seg[i])
+    seg_len = haversine_np(a[mine, 0], a[mine, 1], b[mine, 0], b[mine, 1])
+    j = int(seg_index[i])
+    total = float(seg_len.sum())
+    walked = float(seg_len[:j].sum())
+    t = (walked + float(u[i]) * float(seg_len[j])) / total if total > 0 else 0.0
+    node = int(sources[edge_of_seg[i]])
+    dist = haversine(lat, lon, float(plat[i]), float(plon[i]))
+    best = Snap(node, int(csr.targets[e]), e, t, float(plat[i]), float(plon[i]), dist, j)
+    if best.t in (0.0, 1.0):
+        # Projection fell on a vertex; a node snap is equivalent and simpler
+        node = best.node if best.t == 0.0 else best.other
+        return Snap(node, -1, -1, 0.0, best.lat, best.lon, best.dist)
+    return best
+
+
+def _edge_segments(csr: CSRGraph, edges: np.ndarray,
+                   sources: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Segment endpoints of ``edges`` in travel order.
+
+    Returns ``(a, b, edge_of_seg, seg_index)``: ``(S, 2)`` lat/lon start and end
+    points, the position in ``edges`` of each segment and its index within the edge.
+    """
+    if csr.geom_coords is None:
+        a = csr.coords[sources]
+        b = csr.coords[csr.targets[edges]]
+        n = np.arange(len(edges))
+        return a, b, n, np.zeros(len(edges), dtype=np.int64)
+    first = csr.geom_first[edges]
+    last = csr.geom_last[edges]
+    step = np.where(last >= first, 1, -1)
+    nseg = np.abs(last - first)
+    edge_of_seg = np.repeat(np.arange(len(edges)), nseg)
+    seg_index = np.arange(int(nseg.sum())) - np.repeat(np.cumsum(nseg) - nseg, nseg)
+    start = first[edge_of_seg] + step[edge_of_seg] * seg_index
+    return csr.geom_coords[start], csr.geom_coords[start + step[edge_of_seg]], edge_of_seg, seg_index
@@ -0,0 +1,85 @@
+"""Live graph updates without a restart.
+
+Road changes rebuild the graph from the snapshot plus the changed roads in a
+background thread, then swap the new router into the executor. Cost
+overrides (closures, roadworks) patch the live router's costs in place.
+"""
+from typing import Any, Dict, List, Optional
+import asyncio
+import os
+import time
+import numpy as np
+from .ch import load_ch
+from .csr_graph import CSRGraph
+from .executor import RouteExecutor
+from .graph_builder import GraphBuilder
+from .landmarks import load_landmarks
+from .router import Router
+
+
+def router_from_builder(builder: GraphBuilder, csr: CSRGraph, overrides: Optional[Dict[int, float]] = None) -> Router:
+    """Router over the builder's current snapshot, with its index and matching landmarks and CH."""
+    # Landmarks and CH are optional; built offline with backend/tools/build_landmarks.py and build_ch.py
+    # A graph served from memory has no checksum, so no file can be proven to match it
+    fingerprint = (builder.snapshot_header or {}).get('checksum')
+    ch = landmarks = None
+    if fingerprint:
+        ch = load_ch(os.getenv('GRAPH_CH_PATH', 'backend/data/graph.ch.pfg'), fingerprint)
+        landmarks = load_landmarks(os.getenv('GRAPH_LANDMARKS_PATH', 'backend/data/graph.lm.pfg'), fingerprint)
+    snapshot_path = str(builder.snapshot_file) if fingerprint and builder.snapshot_file else None
+    router = Router(csr, index=builder.index, ch=ch, landmarks=landmarks, snapshot_path=snapshot_path,
+                    snapshot_checksum=fingerprint)
+    if overrides and csr.edge_road is not None:
+        # Overrides of roads deleted since are dropped
+        kept = np.isin(list(overrides), csr.edge_road)
+        dropped = [road for road, keep in zip(overrides, kept) if not keep]
+        if dropped:
+            print(f"[Updater] Dropping overrides of deleted roads {dropped}")
+        overrides = {road: overrides[road] for road, keep in zip(overrides, kept) if keep}
+    if overrides:
+        router.apply_overrides(overrides)
+    return router
+
+
+class GraphUpdater:
+    def __init__(self, builder: GraphBuilder, executor: RouteExecutor):
+        self.builder = builder
+        self.executor = executor
+        # One update at a time; overrides wait for a running rebuild
+        self._lock = asyncio.Lock()
+
+    async def update_roads(self, upserted: List[int], deleted: List[int]) -> Dict[str, Any]:
+        """Apply changed road ids, or the pending ``road_changes`` log when both are empty."""
+        async with self._lock:
+            t0 = time.perf_counter()
+            overrides = dict(self.executor.router.overrides)
+            router = await asyncio.to_thread(self._rebuild, upserted, deleted, overrides)
+            if router is None:
+                return {"changed": False}
+            # The old router keeps serving until here
+            self.executor.swap(router)
+            print(f"[Updater] Swapped in graph with {router.csr.num_nodes} nodes in {time.perf_counter() - t0:.1f}s")
+            return {
+                "changed": True,
+                "nodes": router.csr.num_nodes,
+                "edges": router.csr.num_edges,
+                "seconds": round(time.perf_counter() - t0, 3),
+            }
+
+    def _rebuild(self, upserted: List[int], deleted: List[int], overrides: Dict[int, float]) -> Optional[Router]:
+        change_id = None
+        if not upserted and not deleted:
+            upserted, deleted, change_id = self.builder.read_changes()
+            if change_id is None:
+                return None
+        csr = self.builder.update_roads(upserted, deleted, change_id)
+        return router_from_builder(self.builder, csr, overrides)
+
+    async def set_overrides(self, changes: Dict[int, Optional[float]]) -> int:
+        """Apply cost overrides in place and restart workers with them; returns edges changed."""
+        async with self._lock:
+            router = self.executor.router
+            changed = await asyncio.to_thread(router.apply_overrides, changes)
+            if self.executor.pool is not None:
+                self.executor.swap(router)
+            return changed
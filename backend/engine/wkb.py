@@ -0,0 +1,38 @@
+from typing import List
+import struct
+import numpy as np
+
+WKB_LINESTRING = 2
+WKB_MULTILINESTRING = 5
+
+
+def _read_linestring(buf: memoryview, pos: int, endian: str):
+    n = struct.unpack_from(endian + 'I', buf, pos)[0]
+    pos += 4
+    pts = np.frombuffer(buf, dtype=endian + 'f8', count=2 * n, offset=pos).reshape(n, 2)
+    return pts, pos + 16 * n
+
+
+def parse_lines(data) -> List[np.ndarray]:
+    """Parse 2D (Multi)LineString WKB into ``(n, 2)`` lon/lat float64 arrays.
+
+    Other geometry types return an empty list.
+    """
+    buf = memoryview(data)
+    endian = '<' if buf[0] == 1 else '>'
+    gtype = struct.unpack_from(endian + 'I', buf, 1)[0]
+    if gtype == WKB_LINESTRING:
+        pts, _ = _read_linestring(buf, 5, endian)
+        return [pts]
+    if gtype == WKB_MULTILINESTRING:
+        parts = []
+        count = struct.unpack_from(endian + 'I', buf, 5)[0]
+        pos = 9
+        for _ in range(count):
+            part_endian = '<' if buf[pos] == 1 else '>'
+            if struct.unpack_from(part_endian + 'I', buf, pos + 1)[0] != WKB_LINESTRING:
+                return []
+            pts, pos = _read_linestring(buf, pos + 5, part_endian)
+            parts.append(pts)
+        return parts
+    return []
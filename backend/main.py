@@ -1,9 +1,11 @@
 import os
 from fastapi import FastAPI
 from dotenv import load_dotenv
-from .api.routes import router as api_router, engine_objects
+from .api.routes import router as api_router, admin_router, engine_objects
 from .engine.graph_builder import GraphBuilder
 from .engine.router import Router
+from .engine.executor import RouteExecutor
+from .engine.updates import GraphUpdater, router_from_builder
 from fastapi.middleware.cors import CORSMiddleware
 
 load_dotenv()
@@ -15,17 +17,23 @@ import logging
 async def lifespan(app: FastAPI):
     try:
         builder = GraphBuilder()
-        graph = builder.build()
-        router = Router(graph, builder.node_index)
+        csr = builder.build_csr()
+        router = router_from_builder(builder, csr)
         engine_objects['builder'] = builder
         engine_objects['router'] = router
-        logging.info(f"Routing engine initialized: nodes={len(builder.node_index)} edges={sum(len(v) for v in graph.values())}")
+        engine_objects['executor'] = RouteExecutor(router)
+        engine_objects['updater'] = GraphUpdater(builder, engine_objects['executor'])
+        logging.info(f"Routing engine initialized: nodes={csr.num_nodes} edges={csr.num_edges}")
     except Exception as e:
         logging.error(f"Failed to initialize routing engine: {e}")
         # Fallback to empty graph; API will return 500/404 appropriately
         engine_objects['builder'] = None
         engine_objects['router'] = Router({}, {})
+        engine_objects['executor'] = RouteExecutor(engine_objects['router'], workers=0)
     yield
+    executor = engine_objects.get('executor')
+    if executor:
+        executor.shutdown()
     builder = engine_objects.get('builder')
     if builder:
         builder.close()
@@ -41,5 +49,6 @@ app.add_middleware(
 )
 
 app.include_router(api_router)
+app.include_router(admin_router)
 
 # For local run: uvicorn backend.main:app --reload
@@ -0,0 +1,64 @@
+"""CH queries must return the same path costs as A* on synthetic graphs."""
+import random
+import pytest
+from backend.engine.ch import build_ch
+from backend.engine.graph_builder import GraphBuilder
+from backend.engine.router import Router
+from backend.engine.spatial_index import Snap
+from backend.tools.bench_routing import geometric_ways, grid_ways
+
+PAIRS = 150
+
+
+@pytest.fixture(scope='module', params=['grid', 'geometric'])
+def router(request):
+    ways = grid_ways(15, seed=7) if request.param == 'grid' else geometric_ways(225, seed=7)
+    csr = GraphBuilder()._build_from_ways(*ways)
+    return Router(csr, ch=build_ch(csr), max_settled=0)
+
+
+def node_snap(router, node):
+    return Snap(node, -1, -1, 0.0, *router.csr.coord(node), 0.0)
+
+
+def path_cost(router, edges):
+    return sum(float(router.csr.costs[e]) for e in edges)
+
+
+def test_ch_matches_astar(router):
+    rng = random.Random(42)
+    n = router.csr.num_nodes
+    for _ in range(PAIRS):
+        a, b = rng.randrange(n), rng.randrange(n)
+        expected = router._search(node_snap(router, a), node_snap(router, b), 'astar')
+        found = router._search(node_snap(router, a), node_snap(router, b), 'ch')
+        assert (found is None) == (expected is None), (a, b)
+        if expected is None:
+            continue
+        nodes, edges = found
+        assert nodes[0] == a and nodes[-1] == b
+        # Unpacked shortcuts must form a connected path of original edges
+        assert [int(router.csr.targets[e]) for e in edges] == nodes[1:]
+        assert path_cost(router, edges) == pytest.approx(path_cost(router, expected[1]), rel=1e-6, abs=1e-6)
+
+
+def total_cost(router, start, end, found):
+    nodes, edges = found
+    if not nodes:
+        return 0.0
+    # Partial edges from the snapped points to the first and last node
+    return router._sources(start)[nodes[0]] + path_cost(router, edges) + router._targets(end)[nodes[-1]]
+
+
+def test_ch_matches_astar_between_edge_snaps(router):
+    rng = random.Random(7)
+    lats, lons = router.csr.coords[:, 0], router.csr.coords[:, 1]
+    for _ in range(PAIRS // 3):
+        start, end = (router.index.snap_edge(rng.uniform(lats.min(), lats.max()), rng.uniform(lons.min(), lons.max()),
+                                             router.csr) for _ in range(2))
+        expected = router._search(start, end, 'astar')
+        found = router._search(start, end, 'ch')
+        assert (found is None) == (expected is None)
+        if expected is not None:
+            assert total_cost(router, start, end, found) == pytest.approx(total_cost(router, start, end, expected),
+                                                                          rel=1e-6, abs=1e-6)
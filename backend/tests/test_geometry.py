@@ -0,0 +1,48 @@
+"""Route encodings must round-trip within their stated precision."""
+import random
+import numpy as np
+import pytest
+from backend.engine.geometry import decode_polyline, encode_polyline, pack_coords, simplify
+
+
+@pytest.fixture
+def coords():
+    # A wandering route with points on both hemispheres and past longitude 128
+    rng = random.Random(3)
+    lat, lon = -33.9, 151.2
+    points = []
+    for _ in range(500):
+        lat += rng.uniform(-0.001, 0.001)
+        lon += rng.uniform(-0.001, 0.001)
+        points.append((lat, lon))
+    return points + [(41.0123456, 28.9876543), (0.0, -179.9999999)]
+
+
+@pytest.mark.parametrize('precision', [5, 6])
+def test_polyline_round_trip(coords, precision):
+    decoded = decode_polyline(encode_polyline(coords, precision), precision)
+    assert len(decoded) == len(coords)
+    assert np.abs(np.subtract(decoded, coords)).max() <= 0.5 * 10 ** -precision + 1e-12
+
+
+def test_pack_coords_resolution(coords):
+    packed = pack_coords(coords)
+    assert len(packed) == 8 * len(coords)
+    unpacked = np.frombuffer(packed, dtype='<i4').reshape(-1, 2) / 1e7
+    assert np.abs(unpacked - np.asarray(coords)).max() <= 0.5e-7 + 1e-12
+
+
+def test_simplify_keeps_ends_and_tolerance(coords):
+    route = coords[:500]
+    kept = simplify(route, 5.0)
+    assert kept[0] == route[0] and kept[-1] == route[-1]
+    assert len(kept) < len(route)
+    # Every dropped point lies within the tolerance of its simplified segment
+    kx = 111195.0 * np.cos(np.radians(route[0][0]))
+    xy = np.asarray(route) * [111195.0, kx]
+    index = [route.index(p) for p in kept]
+    for a, b in zip(index, index[1:]):
+        seg = xy[b] - xy[a]
+        rel = xy[a + 1:b] - xy[a]
+        dist = np.abs(rel[:, 0] * seg[1] - rel[:, 1] * seg[0]) / np.hypot(*seg)
+        assert dist.max(initial=0.0) <= 5.0 + 1e-6
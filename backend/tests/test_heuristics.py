@@ -0,0 +1,35 @@
+"""Distance kernels must match haversine within their stated bounds, and A* must stay admissible."""
+import numpy as np
+import pytest
+from backend.engine.heuristics import (EQUIRECT_MAX_REL_ERROR, PlanarLowerBound, equirectangular_np,
+                                       haversine, haversine_np)
+from backend.tools.bench_distances import random_pairs
+
+
+@pytest.fixture(scope='module')
+def pairs():
+    # Spans up to 100 km below 70 degrees latitude
+    return random_pairs(np.random.default_rng(42), 20000, 100e3, 70.0)
+
+
+def test_haversine_np_matches_scalar(pairs):
+    scalar = [haversine(*p) for p in zip(*(a.tolist() for a in pairs))]
+    assert np.abs(haversine_np(*pairs) - scalar).max() <= 1e-6
+
+
+def test_equirectangular_error_bound(pairs):
+    exact = haversine_np(*pairs)
+    rel = (equirectangular_np(*pairs) - exact) / exact
+    assert rel.max() <= EQUIRECT_MAX_REL_ERROR
+    assert rel.min() >= -1e-8
+
+
+def test_planar_lower_bound_admissible():
+    # A 6 x 19 degree box, about the size of Turkey
+    rng = np.random.default_rng(7)
+    coords = np.column_stack([rng.uniform(36.0, 42.0, 5000), rng.uniform(26.0, 45.0, 5000)])
+    bound = PlanarLowerBound(coords)
+    for lat, lon in coords[rng.choice(len(coords), 20, replace=False)].tolist():
+        heuristic = bound.to(lat, lon)
+        h = np.array([heuristic(node) for node in range(len(coords))])
+        assert (h <= haversine_np(coords[:, 0], coords[:, 1], lat, lon)).all()
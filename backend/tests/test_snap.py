@@ -0,0 +1,58 @@
+"""Edge snapping must find the closest road, however far its junctions are."""
+import numpy as np
+import pytest
+from backend.engine.graph_builder import GraphBuilder
+from backend.engine.heuristics import haversine_np
+from backend.engine.spatial_index import GridIndex, _edge_segments
+from backend.tools.bench_routing import _pack, grid_ways
+
+
+def brute_force(csr, lat, lon):
+    # Closest point over every segment of every edge, sampled densely
+    edges = np.arange(csr.num_edges)
+    a, b, _, _ = _edge_segments(csr, edges, csr.edge_sources())
+    u = np.linspace(0.0, 1.0, 201)[:, None]
+    pts = a[None] + (b - a)[None] * u[..., None]
+    pts = pts.reshape(-1, 2)
+    return float(haversine_np(lat, lon, pts[:, 0], pts[:, 1]).min())
+
+
+@pytest.fixture(scope='module')
+def long_road():
+    # A 0.1 degree straight road at lat 41.0, with a 6x6 street grid 500 m north
+    road = [[(29.0, 41.0), (29.1, 41.0)]]
+    grid = []
+    for i in range(6):
+        grid.append([(29.04 + j * 0.002, 41.0045 + i * 0.002) for j in range(6)])
+        grid.append([(29.04 + i * 0.002, 41.0045 + j * 0.002) for j in range(6)])
+    return GraphBuilder()._build_from_ways(*_pack(road + grid))
+
+
+def test_long_road_beats_closer_junctions(long_road):
+    index = GridIndex(long_road.coords, 0.01)
+    snap = index.snap_edge(41.0001, 29.05, long_road)
+    assert snap.dist == pytest.approx(11.1, abs=0.2)
+    assert snap.lat == pytest.approx(41.0)
+
+
+@pytest.mark.parametrize('cell', [0.001, 0.01, 0.1])
+def test_snap_matches_brute_force(long_road, cell):
+    grid = GraphBuilder()._build_from_ways(*grid_ways(8, seed=5))
+    rng = np.random.default_rng(1)
+    for csr in (long_road, grid):
+        index = GridIndex(csr.coords, cell)
+        lo, hi = csr.coords.min(axis=0) - 0.003, csr.coords.max(axis=0) + 0.003
+        for lat, lon in rng.uniform(lo, hi, (25, 2)):
+            snap = index.snap_edge(lat, lon, csr)
+            # Dense sampling overestimates the true minimum by at most a few cm
+            assert snap.dist <= brute_force(csr, lat, lon) + 1e-6
+
+
+def test_edge_index_survives_snapshot(long_road, tmp_path):
+    from backend.engine.snapshot import load_graph, save_graph
+    index = GridIndex(long_road.coords, 0.01)
+    index.index_edges(long_road)
+    save_graph(tmp_path / 'g.pfg', long_road, index)
+    csr, loaded, _, _ = load_graph(tmp_path / 'g.pfg')
+    assert np.array_equal(loaded.edge_keys, index.edge_keys)
+    assert loaded.snap_edge(41.0001, 29.05, csr) == index.snap_edge(41.0001, 29.05, long_road)
@@ -0,0 +1,64 @@
+"""Time the vectorized distance kernels against the scalar haversine.
+
+Usage: python -m backend.tools.bench_distances [--pairs 200000] [--seed 42]
+
+Their accuracy is checked by backend/tests/test_heuristics.py.
+"""
+import argparse
+import time
+import numpy as np
+from backend.engine.heuristics import R, PlanarLowerBound, equirectangular_np, haversine, haversine_np
+
+
+def random_pairs(rng, n: int, max_dist: float, max_lat: float):
+    # Start points anywhere below max_lat, end points at a random bearing and distance
+    lat1 = rng.uniform(-max_lat, max_lat, n)
+    lon1 = rng.uniform(-179.0, 179.0, n)
+    bearing = rng.uniform(0, 2 * np.pi, n)
+    dist = rng.uniform(1.0, max_dist, n)
+    lat2 = lat1 + np.degrees(dist * np.cos(bearing) / R)
+    lon2 = lon1 + np.degrees(dist * np.sin(bearing) / (R * np.cos(np.radians(lat1))))
+    keep = np.abs(lat2) <= max_lat
+    return lat1[keep], lon1[keep], lat2[keep], lon2[keep]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pairs', type=int, default=200000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    rng = np.random.default_rng(args.seed)
+
+    lat1, lon1, lat2, lon2 = random_pairs(rng, args.pairs, 100e3, 70.0)
+    t0 = time.perf_counter()
+    for a, b, c, d in zip(lat1.tolist(), lon1.tolist(), lat2.tolist(), lon2.tolist()):
+        haversine(a, b, c, d)
+    t_scalar = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    haversine_np(lat1, lon1, lat2, lon2)
+    t_vector = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    equirectangular_np(lat1, lon1, lat2, lon2)
+    t_approx = time.perf_counter() - t0
+    n = len(lat1)
+    print(f"{n} pairs: scalar {t_scalar / n * 1e9:.0f} ns/pair, haversine_np {t_vector / n * 1e9:.1f} ns/pair, "
+          f"equirectangular_np {t_approx / n * 1e9:.1f} ns/pair")
+
+    # Heuristic over a 6 x 19 degree box, about the size of Turkey
+    coords = np.column_stack([rng.uniform(36.0, 42.0, args.pairs), rng.uniform(26.0, 45.0, args.pairs)])
+    heuristic = PlanarLowerBound(coords).to(39.0, 35.0)
+    nodes = list(range(min(n, 100000)))
+    t0 = time.perf_counter()
+    for node in nodes:
+        heuristic(node)
+    t_h = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for node in nodes:
+        haversine(*coords[node].tolist(), 39.0, 35.0)
+    t_old = time.perf_counter() - t0
+    print(f"A* heuristic call: PlanarLowerBound {t_h / len(nodes) * 1e9:.0f} ns, "
+          f"scalar haversine {t_old / len(nodes) * 1e9:.0f} ns")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Compare A* heuristics (haversine vs ALT landmarks, plus CH if built).
+
+Usage: python -m backend.tools.bench_heuristics [--snapshot PATH] [--pairs 200]
+
+Reports settled nodes and latency per algorithm on the same random node pairs,
+and how many path costs differ from the first (A*) result.
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+from dotenv import load_dotenv
+from backend.engine.ch import load_ch
+from backend.engine.landmarks import build_landmarks, load_landmarks
+from backend.engine.router import Router
+from backend.engine.snapshot import load_graph
+from backend.engine.spatial_index import Snap
+
+load_dotenv()
+
+
+def node_snap(csr, node):
+    return Snap(node, -1, -1, 0.0, *csr.coord(node), 0.0)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--snapshot', default=os.getenv('GRAPH_SNAPSHOT_PATH', 'backend/data/graph.pfg'))
+    parser.add_argument('--ch', default=os.getenv('GRAPH_CH_PATH', 'backend/data/graph.ch.pfg'))
+    parser.add_argument('--lm', default=os.getenv('GRAPH_LANDMARKS_PATH', 'backend/data/graph.lm.pfg'))
+    parser.add_argument('--pairs', type=int, default=200)
+    parser.add_argument('--landmarks', type=int, default=8, help='computed when no landmark file matches')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    csr, index, _, header = load_graph(args.snapshot)
+    landmarks = load_landmarks(args.lm, header['checksum'])
+    if landmarks is None:
+        t0 = time.perf_counter()
+        landmarks = build_landmarks(csr, args.landmarks)
+        print(f"landmarks: {landmarks.count} computed in {time.perf_counter() - t0:.1f}s")
+    router = Router(csr, index=index, ch=load_ch(args.ch, header['checksum']), landmarks=landmarks)
+
+    rng = random.Random(args.seed)
+    pairs = [(rng.randrange(csr.num_nodes), rng.randrange(csr.num_nodes)) for _ in range(args.pairs)]
+    print(f"graph: nodes={csr.num_nodes} edges={csr.num_edges} pairs={args.pairs}")
+    print(f"{'algorithm':<10} {'settled avg':>12} {'settled p50':>12} {'ms avg':>9} {'ms p95':>9} {'cost diff':>10}")
+    reference = {}
+    for algorithm in router.algorithms():
+        settled, times = [], []
+        diffs = 0
+        for a, b in pairs:
+            stats = {}
+            t0 = time.perf_counter()
+            found = router._search(node_snap(csr, a), node_snap(csr, b), algorithm, stats)
+            times.append((time.perf_counter() - t0) * 1000)
+            settled.append(stats.get('settled', 0))
+            cost = sum(float(csr.costs[e]) for e in found[1]) if found else None
+            ref = reference.setdefault((a, b), cost)
+            if (cost is None) != (ref is None) or (cost is not None and abs(cost - ref) > 1e-3 * max(ref, 1.0)):
+                diffs += 1
+        times.sort()
+        p95 = times[int(0.95 * (len(times) - 1))]
+        print(f"{algorithm:<10} {statistics.mean(settled):>12.0f} {statistics.median(settled):>12.0f} "
+              f"{statistics.mean(times):>9.2f} {p95:>9.2f} {diffs:>10}")
+
+
+if __name__ == '__main__':
+    main()
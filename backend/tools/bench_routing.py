@@ -0,0 +1,153 @@
+"""Reproducible routing benchmark on synthetic graphs (no PostGIS needed).
+
+Usage: python -m backend.tools.bench_routing [--graph grid|geometric|both] [--size 60] [--queries 200]
+
+``grid`` is a street grid of ``size x size`` intersections with shape points and
+some missing streets; ``geometric`` is ``size**2`` random points each joined
+to its 3 nearest neighbours. Both go through the real way builder. For each
+graph the script reports build time per stage, array memory, snap latency
+per snap mode, and search/geometry latency and settled nodes per algorithm.
+"""
+import argparse
+import random
+import resource
+import statistics
+import time
+import numpy as np
+from backend.engine.ch import build_ch
+from backend.engine.graph_builder import GraphBuilder
+from backend.engine.landmarks import build_landmarks
+from backend.engine.router import Router
+from backend.engine.spatial_index import GridIndex
+
+ORIGIN = (41.0, 29.0)  # lat, lon
+
+
+def grid_ways(size: int, seed: int, spacing: float = 0.001, drop: float = 0.1):
+    """Row and column streets with a shape point between intersections; ``drop`` of the blocks are missing."""
+    rng = random.Random(seed)
+    lat0, lon0 = ORIGIN
+    ways = []
+    for i in range(size):
+        for horizontal in (True, False):
+            line = []
+            for j in range(size):
+                lat, lon = (lat0 + i * spacing, lon0 + j * spacing) if horizontal else (lat0 + j * spacing, lon0 + i * spacing)
+                if line and rng.random() < drop:
+                    ways.append(line)
+                    line = []
+                if line:
+                    # Shape point with a small bend, like a real street
+                    plat, plon = line[-1][1], line[-1][0]
+                    line.append(((plon + lon) / 2 + rng.uniform(-1, 1) * spacing * 0.05,
+                                 (plat + lat) / 2 + rng.uniform(-1, 1) * spacing * 0.05))
+                line.append((lon, lat))
+            ways.append(line)
+    return _pack([w for w in ways if len(w) > 1])
+
+
+def geometric_ways(count: int, seed: int, k: int = 3, spacing: float = 0.001):
+    """Random points over the same area as a grid of ``sqrt(count)``, each linked to its ``k`` nearest."""
+    rng = np.random.default_rng(seed)
+    side = spacing * max(1.0, count ** 0.5)
+    coords = np.column_stack([ORIGIN[0] + rng.uniform(0, side, count), ORIGIN[1] + rng.uniform(0, side, count)])
+    index = GridIndex(coords, spacing * 4)
+    pairs = set()
+    for a in range(count):
+        for b, _ in index.knn(coords[a, 0], coords[a, 1], k + 1):
+            if b != a:
+                pairs.add((min(a, b), max(a, b)))
+    ways = [[(coords[a, 1], coords[a, 0]), (coords[b, 1], coords[b, 0])] for a, b in sorted(pairs)]
+    return _pack(ways)
+
+
+def _pack(ways):
+    points = np.array([p for w in ways for p in w], dtype=np.float64)
+    offsets = np.zeros(len(ways) + 1, dtype=np.int64)
+    np.cumsum([len(w) for w in ways], out=offsets[1:])
+    return points, offsets
+
+
+def _timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - t0
+
+
+def _nbytes(arrays) -> int:
+    return sum(int(a.nbytes) for a in arrays.values())
+
+
+def _summary(values):
+    values = sorted(values)
+    if not values:
+        return 0.0, 0.0, 0.0
+    return statistics.mean(values), values[len(values) // 2], values[int(0.95 * (len(values) - 1))]
+
+
+def bench(name: str, points: np.ndarray, offsets: np.ndarray, args):
+    print(f"\n== {name}: {len(offsets) - 1} ways, {len(points)} points")
+    csr, t_graph = _timed(GraphBuilder()._build_from_ways, points, offsets)
+    index, t_index = _timed(GridIndex, csr.coords)
+    landmarks, t_lm = _timed(build_landmarks, csr, args.landmarks) if args.landmarks else (None, 0.0)
+    ch, t_ch = _timed(build_ch, csr) if args.ch else (None, 0.0)
+    print(f"graph: nodes={csr.num_nodes} edges={csr.num_edges}")
+    print(f"build s: graph={t_graph:.2f} index={t_index:.2f} landmarks={t_lm:.2f} ch={t_ch:.2f}")
+    memory = {'csr': _nbytes(csr.to_arrays()), 'index': _nbytes(index.to_arrays())}
+    if landmarks is not None:
+        memory['landmarks'] = _nbytes(landmarks.to_arrays())
+    if ch is not None:
+        memory['ch'] = _nbytes(ch.to_arrays())
+    print("memory MB: " + " ".join(f"{k}={v / 2**20:.1f}" for k, v in memory.items())
+          + f" (max RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f})")
+
+    rng = random.Random(args.seed)
+    lats, lons = csr.coords[:, 0], csr.coords[:, 1]
+    box = (float(lats.min()), float(lats.max()), float(lons.min()), float(lons.max()))
+    queries = [(rng.uniform(box[0], box[1]), rng.uniform(box[2], box[3]),
+                rng.uniform(box[0], box[1]), rng.uniform(box[2], box[3])) for _ in range(args.queries)]
+
+    print(f"{'mode':<6} {'algorithm':<10} {'snap ms':>8} {'search avg':>11} {'p50':>7} {'p95':>7} "
+          f"{'geom ms':>8} {'settled avg':>12}")
+    for snap_mode in ('node', 'edge'):
+        router = Router(csr, index=index, ch=ch, landmarks=landmarks, snap_mode=snap_mode, max_settled=0)
+        # Measure the engine, not the caches
+        router.route_cache.max_bytes = router.snap_cache.max_bytes = 0
+        snaps, snap_times = [], []
+        for lat1, lon1, lat2, lon2 in queries:
+            t0 = time.perf_counter()
+            pair = (router.snap(lat1, lon1), router.snap(lat2, lon2))
+            snap_times.append((time.perf_counter() - t0) * 500)  # ms per point
+            if None not in pair:
+                snaps.append(pair)
+        for algorithm in router.algorithms():
+            search, geometry, settled = [], [], []
+            for start, end in snaps:
+                timings, stats = {}, {}
+                router.route_snaps(start, end, algorithm, timings, stats)
+                search.append(timings['search'] * 1000)
+                geometry.append(timings['geometry'] * 1000)
+                settled.append(stats.get('settled', 0))
+            avg, p50, p95 = _summary(search)
+            print(f"{snap_mode:<6} {algorithm:<10} {statistics.mean(snap_times):>8.3f} {avg:>11.2f} {p50:>7.2f} "
+                  f"{p95:>7.2f} {statistics.mean(geometry):>8.3f} {statistics.mean(settled):>12.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--graph', choices=('grid', 'geometric', 'both'), default='both')
+    parser.add_argument('--size', type=int, default=60, help='grid side; the geometric graph gets size**2 points')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--landmarks', type=int, default=8, help='0 skips ALT')
+    parser.add_argument('--no-ch', dest='ch', action='store_false', help='skip CH preprocessing')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    if args.graph in ('grid', 'both'):
+        bench(f"grid {args.size}x{args.size}", *grid_ways(args.size, args.seed), args)
+    if args.graph in ('geometric', 'both'):
+        bench(f"geometric n={args.size ** 2}", *geometric_ways(args.size ** 2, args.seed), args)
+
+
+if __name__ == '__main__':
+    main()
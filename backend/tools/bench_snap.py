@@ -0,0 +1,64 @@
+"""Compare nearest-node snapping: linear haversine scan vs GridIndex.
+
+Usage: python -m backend.tools.bench_snap --nodes 200000 --queries 200
+"""
+import argparse
+import random
+import time
+import numpy as np
+from backend.engine.heuristics import haversine
+from backend.engine.spatial_index import GridIndex
+
+
+def linear_nearest(coords, lat, lon):
+    # The original Router._nearest_node scan
+    best = None
+    best_d = float('inf')
+    for nid, (nlat, nlon) in enumerate(coords):
+        d = haversine(lat, lon, nlat, nlon)
+        if d < best_d:
+            best_d = d
+            best = nid
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--nodes', type=int, default=200000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--bbox', default='28.90,41.00,29.10,41.10', help='minlon,minlat,maxlon,maxlat')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    minlon, minlat, maxlon, maxlat = (float(v) for v in args.bbox.split(','))
+    rng = np.random.default_rng(args.seed)
+    coords = np.column_stack([
+        rng.uniform(minlat, maxlat, args.nodes),
+        rng.uniform(minlon, maxlon, args.nodes),
+    ])
+    random.seed(args.seed)
+    queries = [(random.uniform(minlat, maxlat), random.uniform(minlon, maxlon)) for _ in range(args.queries)]
+
+    t0 = time.perf_counter()
+    index = GridIndex(coords)
+    build_s = time.perf_counter() - t0
+
+    coord_list = coords.tolist()
+    t0 = time.perf_counter()
+    expected = [linear_nearest(coord_list, lat, lon) for lat, lon in queries]
+    linear_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    found = [index.nearest(lat, lon)[0] for lat, lon in queries]
+    index_s = time.perf_counter() - t0
+
+    mismatches = sum(1 for a, b in zip(expected, found) if a != b)
+    print(f"nodes={args.nodes} queries={args.queries}")
+    print(f"grid build:   {build_s * 1000:.1f} ms")
+    print(f"linear scan:  {linear_s / args.queries * 1000:.3f} ms/query")
+    print(f"grid index:   {index_s / args.queries * 1000:.3f} ms/query")
+    print(f"speedup:      {linear_s / max(index_s, 1e-9):.0f}x  mismatches={mismatches}")
+
+
+if __name__ == '__main__':
+    main()
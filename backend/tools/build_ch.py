@@ -0,0 +1,77 @@
+"""Build a Contraction Hierarchy from the graph snapshot.
+
+Usage: python -m backend.tools.build_ch [--snapshot PATH] [--out PATH] [--verify 200]
+
+--verify N routes N random node pairs with CH and A* and compares the costs.
+"""
+import argparse
+import os
+import random
+import time
+from dotenv import load_dotenv
+from backend.engine.ch import build_ch, save_ch
+from backend.engine.router import Router
+from backend.engine.snapshot import load_graph
+from backend.engine.spatial_index import Snap
+
+load_dotenv()
+
+
+def path_cost(router, edges):
+    return sum(float(router.csr.costs[e]) for e in edges)
+
+
+def verify(router, pairs, seed):
+    rng = random.Random(seed)
+    n = router.csr.num_nodes
+    mismatches = 0
+    t_astar = t_ch = 0.0
+    for _ in range(pairs):
+        a, b = rng.randrange(n), rng.randrange(n)
+        sa = Snap(a, -1, -1, 0.0, *router.csr.coord(a), 0.0)
+        sb = Snap(b, -1, -1, 0.0, *router.csr.coord(b), 0.0)
+        t0 = time.perf_counter()
+        expected = router._search(sa, sb, 'astar')
+        t1 = time.perf_counter()
+        found = router._search(sa, sb, 'ch')
+        t2 = time.perf_counter()
+        t_astar += t1 - t0
+        t_ch += t2 - t1
+        if expected is None or found is None:
+            if (expected is None) != (found is None):
+                mismatches += 1
+                print(f"  reachability differs for {a}->{b}")
+            continue
+        ca, cc = path_cost(router, expected[1]), path_cost(router, found[1])
+        if found[0][0] != a or found[0][-1] != b or abs(ca - cc) > 1e-3 * max(ca, 1.0):
+            mismatches += 1
+            print(f"  cost differs for {a}->{b}: astar={ca:.1f} ch={cc:.1f}")
+    print(f"verified {pairs} pairs: mismatches={mismatches}")
+    print(f"astar {t_astar / pairs * 1000:.2f} ms/query, ch {t_ch / pairs * 1000:.2f} ms/query")
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--snapshot', default=os.getenv('GRAPH_SNAPSHOT_PATH', 'backend/data/graph.pfg'))
+    parser.add_argument('--out', default=os.getenv('GRAPH_CH_PATH', 'backend/data/graph.ch.pfg'))
+    parser.add_argument('--witness-limit', type=int, default=50)
+    parser.add_argument('--verify', type=int, default=0, help='random pairs to compare against A*')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    csr, index, _, header = load_graph(args.snapshot)
+    print(f"graph: nodes={csr.num_nodes} edges={csr.num_edges}")
+    t0 = time.perf_counter()
+    ch = build_ch(csr, args.witness_limit, progress=True)
+    print(f"contracted in {time.perf_counter() - t0:.1f}s, shortcuts={ch.num_shortcuts}")
+    save_ch(args.out, ch, header['checksum'])
+    print(f"written: {args.out}")
+    if args.verify:
+        router = Router(csr, index=index, ch=ch)
+        if verify(router, args.verify, args.seed):
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
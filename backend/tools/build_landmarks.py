@@ -0,0 +1,36 @@
+"""Build ALT landmark distances from the graph snapshot.
+
+Usage: python -m backend.tools.build_landmarks [--snapshot PATH] [--out PATH] [--count 8]
+
+The file records the snapshot checksum; routers load it only for that graph.
+Re-run after every rebuild or road update, as for build_ch.
+"""
+import argparse
+import os
+import time
+from dotenv import load_dotenv
+from backend.engine.landmarks import build_landmarks, save_landmarks
+from backend.engine.snapshot import load_graph
+
+load_dotenv()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--snapshot', default=os.getenv('GRAPH_SNAPSHOT_PATH', 'backend/data/graph.pfg'))
+    parser.add_argument('--out', default=os.getenv('GRAPH_LANDMARKS_PATH', 'backend/data/graph.lm.pfg'))
+    parser.add_argument('--count', type=int, default=int(os.getenv('GRAPH_LANDMARKS', '8')))
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    csr, _, _, header = load_graph(args.snapshot)
+    print(f"graph: nodes={csr.num_nodes} edges={csr.num_edges} checksum={header['checksum']}")
+    t0 = time.perf_counter()
+    landmarks = build_landmarks(csr, args.count, args.seed)
+    print(f"{landmarks.count} landmarks in {time.perf_counter() - t0:.1f}s")
+    save_landmarks(args.out, landmarks, header['checksum'])
+    print(f"written: {args.out}")
+
+
+if __name__ == '__main__':
+    main()
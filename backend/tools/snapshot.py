@@ -0,0 +1,93 @@
+"""Build and inspect graph snapshots.
+
+Usage:
+  python -m backend.tools.snapshot build [--out PATH] [--force]
+  python -m backend.tools.snapshot update [--upsert IDS] [--delete IDS]
+  python -m backend.tools.snapshot inspect [PATH] [--verify]
+"""
+import argparse
+import os
+import time
+from pathlib import Path
+from dotenv import load_dotenv
+from backend.engine.graph_builder import GraphBuilder
+from backend.engine.snapshot import SnapshotError, open_snapshot, read_header, resolve_snapshot
+
+load_dotenv()
+
+
+def build(args):
+    if args.out:
+        os.environ['GRAPH_SNAPSHOT_PATH'] = args.out
+    builder = GraphBuilder()
+    t0 = time.perf_counter()
+    csr = builder.build_csr(force=args.force)
+    builder.close()
+    print(f"snapshot: {builder.snapshot_path} -> {builder.snapshot_file}")
+    print(f"nodes={csr.num_nodes} edges={csr.num_edges} in {time.perf_counter() - t0:.1f}s")
+
+
+def _ids(text):
+    return [int(v) for v in text.split(',') if v.strip()] if text else []
+
+
+def update(args):
+    # Offline counterpart of POST /graph/updates; a running server keeps its mapped copy
+    builder = GraphBuilder()
+    t0 = time.perf_counter()
+    upserted, deleted, change_id = _ids(args.upsert), _ids(args.delete), None
+    if not upserted and not deleted:
+        upserted, deleted, change_id = builder.read_changes()
+        if change_id is None:
+            print("no pending changes")
+            return
+    csr = builder.update_roads(upserted, deleted, change_id)
+    builder.close()
+    print(f"snapshot: {builder.snapshot_path} -> {builder.snapshot_file}")
+    print(f"nodes={csr.num_nodes} edges={csr.num_edges} in {time.perf_counter() - t0:.1f}s")
+
+
+def inspect(args):
+    path = Path(args.path or os.getenv('GRAPH_SNAPSHOT_PATH', 'backend/data/graph.pfg'))
+    header = read_header(path)
+    file = resolve_snapshot(path)
+    print(f"file:        {file} ({file.stat().st_size / 1e6:.1f} MB)")
+    print(f"version:     {header['version']}")
+    print(f"created:     {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(header['created']))}")
+    print(f"fingerprint: {header['fingerprint']}")
+    print(f"checksum:    {header['checksum']}")
+    for key, value in header['meta'].items():
+        print(f"meta.{key}: {value}")
+    for name, info in header['arrays'].items():
+        print(f"  {name:<14} {info['dtype']:<5} {str(tuple(info['shape'])):<18} {info['nbytes'] / 1e6:9.1f} MB")
+    if args.verify:
+        t0 = time.perf_counter()
+        try:
+            open_snapshot(path, verify=True)
+            print(f"checksum OK ({time.perf_counter() - t0:.2f}s)")
+        except SnapshotError as e:
+            print(f"checksum FAILED: {e}")
+            raise SystemExit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_build = sub.add_parser('build', help='build the graph from PostGIS and write a snapshot')
+    p_build.add_argument('--out', help='snapshot path (default GRAPH_SNAPSHOT_PATH)')
+    p_build.add_argument('--force', action='store_true', help='rebuild even if the snapshot is current')
+    p_build.set_defaults(func=build)
+    p_update = sub.add_parser('update', help='apply changed road ids (default: the road_changes log)')
+    p_update.add_argument('--upsert', help='comma-separated road ids to re-read')
+    p_update.add_argument('--delete', help='comma-separated road ids to remove')
+    p_update.set_defaults(func=update)
+    p_inspect = sub.add_parser('inspect', help='print a snapshot header')
+    p_inspect.add_argument('path', nargs='?')
+    p_inspect.add_argument('--verify', action='store_true', help='verify the array checksum')
+    p_inspect.set_defaults(func=inspect)
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,28 @@
+-- Change log for incremental graph updates (POST /graph/updates with an empty body)
+-- Every insert/update/delete on roads is recorded; the graph remembers the last applied id.
+
+CREATE TABLE IF NOT EXISTS road_changes (
+    id BIGSERIAL PRIMARY KEY,
+    road_id BIGINT NOT NULL,
+    op CHAR(1) NOT NULL,  -- I, U or D
+    changed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE OR REPLACE FUNCTION log_road_change() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO road_changes (road_id, op) VALUES (OLD.id, 'D');
+    ELSE
+        IF TG_OP = 'UPDATE' AND OLD.id <> NEW.id THEN
+            INSERT INTO road_changes (road_id, op) VALUES (OLD.id, 'D');
+        END IF;
+        INSERT INTO road_changes (road_id, op) VALUES (NEW.id, left(TG_OP, 1));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS roads_change_log ON roads;
+CREATE TRIGGER roads_change_log
+AFTER INSERT OR UPDATE OR DELETE ON roads
+FOR EACH ROW EXECUTE FUNCTION log_road_change();